@@ -0,0 +1,45 @@
+"""Ingestion jobs table (background upload processing).
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "007"
+down_revision: Union[str, None] = "006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ingestion_jobs",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("scope", sa.String(16), nullable=False),
+        sa.Column("scope_id", sa.Integer(), nullable=False),
+        sa.Column("file_id", sa.Integer(), nullable=True),
+        sa.Column("filename", sa.String(255), nullable=False),
+        sa.Column("status", sa.String(16), nullable=False, server_default="queued"),
+        sa.Column("stage", sa.String(16), nullable=True),
+        sa.Column("chunks_total", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("chunks_done", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_by", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), onupdate=sa.func.now()),
+        sa.ForeignKeyConstraint(["file_id"], ["files.id"], ondelete="SET NULL"),
+        sa.ForeignKeyConstraint(["created_by"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_ingestion_jobs_file_id", "ingestion_jobs", ["file_id"])
+    op.create_index("ix_ingestion_jobs_status", "ingestion_jobs", ["status"])
+    op.create_index("ix_ingestion_jobs_created_by", "ingestion_jobs", ["created_by"])
+
+
+def downgrade() -> None:
+    op.drop_table("ingestion_jobs")
@@ -0,0 +1,35 @@
+"""Content hashes on files and document_chunks for upload/chunk deduplication.
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "008"
+down_revision: Union[str, None] = "007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("files", sa.Column("content_hash", sa.String(64), nullable=True))
+    op.create_index("ix_files_content_hash", "files", ["content_hash"])
+    op.add_column("document_chunks", sa.Column("text_hash", sa.String(64), nullable=True))
+    op.create_index("ix_document_chunks_text_hash", "document_chunks", ["text_hash"])
+    op.add_column(
+        "ingestion_jobs",
+        sa.Column("chunks_deduped", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("ingestion_jobs", "chunks_deduped")
+    op.drop_index("ix_document_chunks_text_hash", table_name="document_chunks")
+    op.drop_column("document_chunks", "text_hash")
+    op.drop_index("ix_files_content_hash", table_name="files")
+    op.drop_column("files", "content_hash")
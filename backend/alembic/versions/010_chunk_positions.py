@@ -0,0 +1,34 @@
+"""Position of each document chunk within its file, for merging adjacent retrieved chunks.
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "010"
+down_revision: Union[str, None] = "009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("document_chunks", sa.Column("chunk_index", sa.Integer(), nullable=True))
+    # Existing chunks were inserted in file order, so id order within a file is chunk order
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("SELECT id, file_id FROM document_chunks ORDER BY file_id, id")).fetchall()
+    updates, file_id, position = [], None, 0
+    for chunk_id, chunk_file_id in rows:
+        position = position + 1 if chunk_file_id == file_id else 0
+        file_id = chunk_file_id
+        updates.append({"id": chunk_id, "chunk_index": position})
+    if updates:
+        conn.execute(sa.text("UPDATE document_chunks SET chunk_index = :chunk_index WHERE id = :id"), updates)
+
+
+def downgrade() -> None:
+    op.drop_column("document_chunks", "chunk_index")
@@ -0,0 +1,26 @@
+"""Owner and heartbeat on ingestion jobs, so several app processes can share the job table.
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "011"
+down_revision: Union[str, None] = "010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("ingestion_jobs", sa.Column("owner", sa.String(64), nullable=True))
+    op.add_column("ingestion_jobs", sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("ingestion_jobs", "heartbeat_at")
+    op.drop_column("ingestion_jobs", "owner")
@@ -1,26 +1,465 @@
-"""Sentence-transformers embeddings. Model loaded once globally."""
+"""Sentence embeddings. Model loaded once globally.
+
+The inference backend is chosen by EMBEDDING_BACKEND: sentence-transformers (PyTorch)
+or an exported ONNX model (optionally int8-quantized) run through onnxruntime.
+
+Embeddings are cached in two levels keyed by (model name, normalized text hash):
+an in-process LRU in front of a SQLite store shared by all workers on the host.
+The store is capped at EMBEDDING_CACHE_MAX_ROWS (approximately least recently used rows
+are evicted) and rows of other models or backend variants are deleted when it is pruned.
+
+Async callers (Ask-AI queries) go through a micro-batcher: concurrent requests
+arriving within EMBEDDING_BATCH_MAX_WAIT_MS share one forward pass off the event loop.
+Forward passes run on a dedicated inference executor; when more than EMBEDDING_QUEUE_MAX
+queries are waiting, new ones fail fast with EmbeddingOverloadedError.
+"""
+import asyncio
+import bisect
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from pathlib import Path
 from typing import List
 
+import numpy as np
+
+from app.config import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_BATCH_MAX_SIZE,
+    EMBEDDING_BATCH_MAX_WAIT_MS,
+    EMBEDDING_CACHE_MAX_ROWS,
+    EMBEDDING_CACHE_MEMORY_ITEMS,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_INFERENCE_THREADS,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_ONNX_DIR,
+    EMBEDDING_ONNX_QUANTIZED,
+    EMBEDDING_QUEUE_MAX,
+)
+
 _embedding_model = None
+_inference_executor: ThreadPoolExecutor | None = None
+_inference_threads = EMBEDDING_INFERENCE_THREADS
+_executor_lock = threading.Lock()
+# Set by stop_embedding_batcher: the inference threads are gone for good in this process
+_executor_closed = False
+
+
+class EmbeddingOverloadedError(Exception):
+    """Raised when too many embedding requests are already waiting."""
+
+
+class EmbeddingShutdownError(Exception):
+    """Raised when encoding is requested after (or cancelled by) app shutdown."""
+
+
+class SentenceTransformerBackend:
+    """PyTorch inference through sentence-transformers."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.variant = "sentence-transformers"
+        self._model = SentenceTransformer(model_name)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self._model.encode(texts, convert_to_numpy=True), dtype=np.float32)
+
+
+class OnnxBackend:
+    """Exported transformer run through onnxruntime, followed by the same mean pooling
+    (and normalization, if the exported model had it) that sentence-transformers applies.
+    """
+
+    def __init__(self, model_dir: Path, quantized: bool = False):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_file = model_dir / ("model_int8.onnx" if quantized else "model.onnx")
+        if not model_file.exists():
+            raise FileNotFoundError(f"{model_file} not found; run scripts/export_onnx_embedding_model.py first")
+        config = json.loads((model_dir / "embedding_config.json").read_text())
+        self.variant = "onnx-int8" if quantized else "onnx"
+        self._normalize = config["normalize"]
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(str(model_file), options, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=config["max_seq_length"])
+        self._tokenizer.enable_padding()
 
-EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+    def encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": np.array([e.ids for e in encodings], dtype=np.int64), "attention_mask": mask}
+        if "token_type_ids" in self._inputs:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        hidden = self._session.run(None, feeds)[0]
+        weights = mask[:, :, None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        if self._normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+
+def _backend_variant() -> str:
+    if EMBEDDING_BACKEND == "onnx":
+        return "onnx-int8" if EMBEDDING_ONNX_QUANTIZED else "onnx"
+    if EMBEDDING_BACKEND == "sentence-transformers":
+        return "sentence-transformers"
+    raise ValueError(f"Unknown EMBEDDING_BACKEND {EMBEDDING_BACKEND!r}; expected 'sentence-transformers' or 'onnx'")
 
 
 def get_embedding_model():
     global _embedding_model
     if _embedding_model is None:
-        from sentence_transformers import SentenceTransformer
-        _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        if EMBEDDING_BACKEND == "onnx":
+            _embedding_model = OnnxBackend(EMBEDDING_ONNX_DIR, EMBEDDING_ONNX_QUANTIZED)
+        else:
+            _embedding_model = SentenceTransformerBackend(EMBEDDING_MODEL_NAME)
     return _embedding_model
 
 
+_VARIANT = _backend_variant()
+# ONNX outputs differ slightly from PyTorch (int8 especially), so each variant keeps its own cache entries
+_MODEL_ID = EMBEDDING_MODEL_NAME if _VARIANT == "sentence-transformers" else f"{EMBEDDING_MODEL_NAME}\0{_VARIANT}"
+
+
+def _get_inference_executor() -> ThreadPoolExecutor:
+    global _inference_executor
+    with _executor_lock:
+        if _executor_closed:
+            raise EmbeddingShutdownError("Embedding service is shutting down")
+        if _inference_executor is None:
+            _inference_executor = ThreadPoolExecutor(
+                max_workers=_inference_threads, thread_name_prefix="embedding-inference"
+            )
+        return _inference_executor
+
+
+def set_inference_threads(threads: int) -> None:
+    """Size the inference executor instead of EMBEDDING_INFERENCE_THREADS (bulk-encoding scripts).
+    Must be called before the first encode.
+    """
+    global _inference_threads
+    with _executor_lock:
+        if _inference_executor is not None:
+            raise RuntimeError("Inference executor already started")
+        _inference_threads = max(1, threads)
+
+
+def _forward(texts: List[str]) -> np.ndarray:
+    return get_embedding_model().encode(texts)
+
+
+def warm_up_embedding_model() -> None:
+    """Load the model and run one forward pass on the inference executor (startup warm-up)."""
+    _get_inference_executor().submit(_forward, ["warm-up"]).result()
+
+
+def _cache_key(text: str) -> str:
+    # Whitespace runs don't change the tokenization, so they don't change the key
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{_MODEL_ID}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+# A disk hit refreshes the row's accessed_at only if it is older than this (keeps reads mostly read-only)
+_TOUCH_INTERVAL_SECONDS = 3600
+# The store is pruned after this many rows were written by this process
+_PRUNE_EVERY_ROWS = 1000
+
+
+class _EmbeddingCache:
+    """In-memory LRU backed by SQLite (WAL, so several worker processes can share it).
+    Each row records the model id that computed it and when it was last used.
+    """
+
+    def __init__(self, path, memory_items: int, max_rows: int = EMBEDDING_CACHE_MAX_ROWS):
+        self._path = path
+        self._memory_items = memory_items
+        self._max_rows = max_rows
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ready = False
+        self._written = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evicted": 0}
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        if not self._ready:
+            self._init_schema(conn)
+        return conn
+
+    def _init_schema(self, conn: sqlite3.Connection) -> None:
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(embeddings)")}
+            # Stores created before eviction: their rows have no model (kept until evicted, adopted on a hit)
+            if "model" not in columns:
+                conn.execute("ALTER TABLE embeddings ADD COLUMN model TEXT")
+            if "accessed_at" not in columns:
+                conn.execute("ALTER TABLE embeddings ADD COLUMN accessed_at INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_accessed_at ON embeddings (accessed_at)")
+        self._ready = True
+        self.prune()
+
+    def prune(self) -> int:
+        """Delete rows of other model ids, then the least recently used rows beyond max_rows
+        (down to 90% of it, so pruning doesn't run on every write). Returns rows deleted.
+        """
+        conn = self._conn()
+        with conn:
+            deleted = conn.execute("DELETE FROM embeddings WHERE model != ?", (_MODEL_ID,)).rowcount
+            excess = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self._max_rows
+            if excess > 0:
+                excess += self._max_rows // 10
+                deleted += conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY accessed_at LIMIT ?)",
+                    (excess,),
+                ).rowcount
+        with self._lock:
+            self.stats["evicted"] += deleted
+        return deleted
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        """Caller holds the lock."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> dict[str, np.ndarray]:
+        found: dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            self.stats["memory_hits"] += len(found)
+        missing = [k for k in dict.fromkeys(keys) if k not in found]
+        if missing:
+            conn = self._conn()
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(missing), 500):
+                part = missing[start : start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = conn.execute(
+                    f"SELECT key, vector, accessed_at FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                now = int(time.time())
+                stale = [key for key, _, accessed_at in rows if now - accessed_at > _TOUCH_INTERVAL_SECONDS]
+                if stale:
+                    with conn:
+                        conn.executemany(
+                            "UPDATE embeddings SET accessed_at = ?, model = ? WHERE key = ?",
+                            [(now, _MODEL_ID, key) for key in stale],
+                        )
+                for key, blob, _ in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            with self._lock:
+                disk_hits = [k for k in missing if k in found]
+                for key in disk_hits:
+                    self._remember(key, found[key])
+                self.stats["disk_hits"] += len(disk_hits)
+                self.stats["misses"] += len(missing) - len(disk_hits)
+        return found
+
+    def put_many(self, items: dict[str, np.ndarray]) -> None:
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+        conn = self._conn()
+        now = int(time.time())
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, model, accessed_at) VALUES (?, ?, ?, ?)",
+                [(k, np.asarray(v, dtype=np.float32).tobytes(), _MODEL_ID, now) for k, v in items.items()],
+            )
+        with self._lock:
+            self._written += len(items)
+            due = self._written >= _PRUNE_EVERY_ROWS
+            if due:
+                self._written = 0
+        if due:
+            self.prune()
+
+
+_cache = _EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MEMORY_ITEMS)
+
+
+def prune_embedding_cache() -> int:
+    """Drop other models' rows and evict beyond EMBEDDING_CACHE_MAX_ROWS now (maintenance). Returns rows deleted."""
+    return _cache.prune()
+
+
+def get_embedding_cache_stats() -> dict:
+    """Memory/disk hit counts and hit rate of the embedding cache."""
+    stats = dict(_cache.stats)
+    lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+    stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+    stats["model"] = EMBEDDING_MODEL_NAME
+    stats["backend"] = _VARIANT
+    return stats
+
+
 def encode(texts: List[str]) -> List[List[float]]:
-    """Encode texts to embeddings. Returns list of vectors."""
-    model = get_embedding_model()
-    embeddings = model.encode(texts, convert_to_numpy=True)
-    return embeddings.tolist()
+    """Encode texts to embeddings. Returns list of vectors. Only cache misses reach the model.
+    Blocking: call from worker threads (ingestion, scripts); async code uses encode_async.
+    """
+    if not texts:
+        return []
+    keys = [_cache_key(t) for t in texts]
+    cached = _cache.get_many(keys)
+    # One forward pass for the misses; duplicates within the batch are encoded once
+    missing = {k: t for k, t in zip(keys, texts) if k not in cached}
+    if missing:
+        try:
+            embeddings = _get_inference_executor().submit(_forward, list(missing.values())).result()
+        except CancelledError as e:
+            raise EmbeddingShutdownError("Embedding service is shutting down") from e
+        computed = dict(zip(missing.keys(), embeddings))
+        _cache.put_many(computed)
+        cached.update(computed)
+    return [cached[k].tolist() for k in keys]
 
 
 def encode_single(text: str) -> List[float]:
     """Encode a single string."""
     return encode([text])[0]
+
+
+class _Histogram:
+    """Bucket counts: counts[i] = observations in (bounds[i-1], bounds[i]]; last bucket is overflow."""
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        labels = [f"<={b:g}" for b in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.total,
+            "mean": self.sum / self.total if self.total else 0.0,
+        }
+
+
+class _EmbeddingBatcher:
+    """Collects concurrent encode requests and runs them as one batched forward pass.
+    A batch closes when it reaches max_size or max_wait_ms after its first request.
+    """
+
+    def __init__(self, max_size: int, max_wait_ms: float):
+        self._max_size = max_size
+        self._max_wait = max_wait_ms / 1000
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.rejected = 0
+        self.batch_sizes = _Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.wait_ms = _Histogram([1, 2, 5, 10, 20, 50, 100, 500])
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(maxsize=EMBEDDING_QUEUE_MAX)
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="embedding-batcher")
+
+    async def submit(self, text: str) -> List[float]:
+        self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((text, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise EmbeddingOverloadedError("Embedding service is busy. Please try again shortly.") from None
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._max_wait
+            while len(batch) < self._max_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            started = time.perf_counter()
+            self.batch_sizes.observe(len(batch))
+            for _, _, enqueued in batch:
+                self.wait_ms.observe((started - enqueued) * 1000)
+            try:
+                vectors = await asyncio.to_thread(encode, [text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future, _), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+_batcher = _EmbeddingBatcher(EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_MAX_WAIT_MS)
+
+
+async def encode_single_async(text: str) -> List[float]:
+    """Encode one string via the micro-batcher; never blocks the event loop."""
+    return await _batcher.submit(text)
+
+
+async def encode_async(texts: List[str]) -> List[List[float]]:
+    """Encode several strings via the micro-batcher; they may share a batch with other requests."""
+    return list(await asyncio.gather(*(_batcher.submit(t) for t in texts)))
+
+
+def get_embedding_batcher_stats() -> dict:
+    """Batch-size and queue-wait (ms) histograms of the micro-batcher."""
+    return {
+        "batch_size": _batcher.batch_sizes.snapshot(),
+        "wait_ms": _batcher.wait_ms.snapshot(),
+        "queued": _batcher._queue.qsize() if _batcher._queue is not None else 0,
+        "rejected": _batcher.rejected,
+        "queue_max": EMBEDDING_QUEUE_MAX,
+        "max_size": EMBEDDING_BATCH_MAX_SIZE,
+        "max_wait_ms": EMBEDDING_BATCH_MAX_WAIT_MS,
+    }
+
+
+async def stop_embedding_batcher() -> None:
+    """Stop the micro-batcher and release the inference threads (lifespan shutdown).
+    Pending and later encode() calls raise EmbeddingShutdownError.
+    """
+    global _inference_executor, _executor_closed
+    await _batcher.stop()
+    with _executor_lock:
+        executor, _inference_executor = _inference_executor, None
+        _executor_closed = True
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,37 @@
+"""Per-scope write locks shared by every process that writes vector_indexes/.
+
+A thread lock serializes writers within a process; an fcntl lock on a .lock file next to the
+index serializes them across processes (uvicorn workers, maintenance scripts). Readers never
+lock: every write is a temp file + os.replace.
+"""
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-process locking unavailable, thread lock only
+    fcntl = None
+
+# lock file path -> thread lock
+_thread_locks: dict[Path, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def locked(lock_path: Path) -> Iterator[None]:
+    """Hold the lock named by lock_path (created if missing) for the duration of the block."""
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(lock_path, threading.Lock())
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, "a+b") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
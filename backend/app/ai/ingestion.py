@@ -0,0 +1,407 @@
+"""Background ingestion: extract -> chunk -> embed -> index for uploaded files.
+
+Uploads create an IngestionJob row and return at once; a pool of asyncio workers
+runs each job's blocking steps in a thread so the event loop (and chat WebSockets)
+stay responsive. Extraction, chunking and embedding are streamed, so embedding starts
+before a large PDF has been fully parsed. Jobs are persisted, so queued or interrupted
+jobs resume on startup.
+
+Several app processes share the job table: a worker claims a job atomically (queued ->
+running, with its owner id) and heartbeats once per chunk batch. A running job is only
+taken over once its heartbeat is older than INGESTION_LEASE_SECONDS (its process died).
+
+Uploads are content-addressed: a file whose bytes were already indexed in the same
+scope is not processed again, and chunks are matched by text hash so existing
+embeddings are reused instead of re-encoded (the chunks are still stored and indexed).
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.ai.embeddings import EmbeddingShutdownError, encode
+from app.ai.lexical_index import add_documents, remove_documents
+from app.ai.rag import invalidate_answer_cache
+from app.ai.text_utils import ExtractionError, iter_chunks, iter_text_from_file
+from app.ai.vector_store import add_vectors_to_index, get_vectors, remove_vectors_from_index
+from app.config import INGESTION_EMBED_BATCH, INGESTION_LEASE_SECONDS, INGESTION_WORKERS, RAG_HYBRID_SEARCH
+from app.database import SessionLocal
+from app.models import DocumentChunk, File, IngestionJob
+
+logger = logging.getLogger(__name__)
+
+_queue: asyncio.Queue | None = None
+_workers: list[asyncio.Task] = []
+_reaper: asyncio.Task | None = None
+# Set on shutdown: jobs still running in threads stop at the next batch and go back to 'queued'
+_stopping = threading.Event()
+# Written to IngestionJob.owner by the jobs this process claims
+_OWNER = f"{socket.gethostname()[:40]}:{os.getpid()}"
+
+
+_dedup_stats = {"files": 0, "duplicate_files": 0, "chunks": 0, "chunks_deduped": 0}
+_dedup_stats_lock = threading.Lock()
+
+
+class IngestionError(Exception):
+    """Raised when an uploaded file can't be turned into indexable chunks."""
+    pass
+
+
+class IngestionInterrupted(Exception):
+    """Raised when shutdown stops a job midway; it goes back to the queue."""
+    pass
+
+
+class _LeaseLost(Exception):
+    """Raised when another process took over a job whose heartbeat had expired."""
+    pass
+
+
+def content_hash(data: bytes) -> str:
+    """sha256 of uploaded file bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def text_hash(text: str) -> str:
+    """sha256 of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def get_dedup_stats() -> dict:
+    """Files and chunks seen by ingestion, and how many were deduplicated."""
+    with _dedup_stats_lock:
+        stats = dict(_dedup_stats)
+    stats["chunk_dedup_ratio"] = stats["chunks_deduped"] / stats["chunks"] if stats["chunks"] else 0.0
+    return stats
+
+
+def _record_dedup(**counts: int) -> None:
+    with _dedup_stats_lock:
+        for name, value in counts.items():
+            _dedup_stats[name] += value
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _claimable():
+    """Jobs a worker may claim: queued, or running with an expired lease."""
+    expired = _now() - timedelta(seconds=INGESTION_LEASE_SECONDS)
+    return or_(
+        IngestionJob.status == "queued",
+        (IngestionJob.status == "running")
+        & or_(IngestionJob.heartbeat_at.is_(None), IngestionJob.heartbeat_at < expired),
+    )
+
+
+def _claim(db: Session, job_id: int) -> bool:
+    """Atomically take a claimable job for this process; False if it is done, failed or owned."""
+    claimed = (
+        db.query(IngestionJob)
+        .filter(IngestionJob.id == job_id, _claimable())
+        .update(
+            {
+                "status": "running", "owner": _OWNER, "heartbeat_at": _now(),
+                "stage": "extract", "chunks_done": 0, "error": None,
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return claimed == 1
+
+
+def _heartbeat(db: Session, job: IngestionJob) -> None:
+    """Extend this process's lease on job; raises _LeaseLost if another process took it over."""
+    renewed = (
+        db.query(IngestionJob)
+        .filter(IngestionJob.id == job.id, IngestionJob.owner == _OWNER, IngestionJob.status == "running")
+        .update({"heartbeat_at": _now()}, synchronize_session=False)
+    )
+    db.commit()
+    if renewed != 1:
+        raise _LeaseLost()
+
+
+def _release(db: Session, job_id: int) -> None:
+    """Hand an interrupted job back to the queue (any process may claim it at once)."""
+    db.query(IngestionJob).filter(IngestionJob.id == job_id, IngestionJob.owner == _OWNER).update(
+        {"status": "queued", "owner": None, "heartbeat_at": None, "stage": None}, synchronize_session=False
+    )
+    db.commit()
+
+
+def _update(db: Session, job: IngestionJob, **fields) -> None:
+    for name, value in fields.items():
+        setattr(job, name, value)
+    db.commit()
+
+
+def _discard_chunks(db: Session, job: IngestionJob, file_id: int) -> None:
+    """Remove chunks (and their vectors) left behind by an earlier, interrupted run."""
+    chunk_ids = [cid for (cid,) in db.query(DocumentChunk.id).filter(DocumentChunk.file_id == file_id)]
+    if not chunk_ids:
+        return
+    remove_vectors_from_index(job.scope, job.scope_id, chunk_ids)
+    remove_documents(job.scope, job.scope_id, chunk_ids)
+    db.query(DocumentChunk).filter(DocumentChunk.file_id == file_id).delete(synchronize_session=False)
+    db.commit()
+
+
+def _batches(items: Iterator[str], size: int) -> Iterator[list[str]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _find_indexed_duplicate(db: Session, job: IngestionJob, file: File) -> File | None:
+    """An earlier, fully indexed upload of the same bytes in the same scope."""
+    if not file.content_hash:
+        return None
+    scope_column = File.course_id if job.scope == "course" else File.group_id
+    return (
+        db.query(File)
+        .join(IngestionJob, IngestionJob.file_id == File.id)
+        .filter(
+            File.content_hash == file.content_hash,
+            File.id != file.id,
+            scope_column == job.scope_id,
+            IngestionJob.status == "done",
+        )
+        .first()
+    )
+
+
+def _match_chunk_hashes(db: Session, file_id: int, hashes: list[str]) -> dict[str, np.ndarray]:
+    """Look up chunk hashes among existing DocumentChunks (any scope).
+    Returns hash -> stored vector, for chunks whose vectors are actually present in their scope index.
+    """
+    if not hashes:
+        return {}
+    rows = (
+        db.query(DocumentChunk.id, DocumentChunk.text_hash, File.course_id, File.group_id)
+        .join(File, File.id == DocumentChunk.file_id)
+        .filter(DocumentChunk.text_hash.in_(set(hashes)), DocumentChunk.file_id != file_id)
+        .all()
+    )
+    by_scope: dict[tuple[str, int], list[tuple[int, str]]] = {}
+    for chunk_id, chunk_hash, course_id, group_id in rows:
+        scope = ("course", course_id) if course_id is not None else ("group", group_id)
+        by_scope.setdefault(scope, []).append((chunk_id, chunk_hash))
+
+    reusable: dict[str, np.ndarray] = {}
+    for (scope, scope_id), matches in by_scope.items():
+        vectors, found = get_vectors(scope, scope_id, [chunk_id for chunk_id, _ in matches])
+        for (_, chunk_hash), vector, ok in zip(matches, vectors, found):
+            if ok:
+                reusable.setdefault(chunk_hash, vector)
+    return reusable
+
+
+def _ingest(db: Session, job: IngestionJob, file: File) -> None:
+    """Stream extract -> chunk -> embed: each batch of chunks is stored and embedded while
+    later pages are still being extracted. Vectors are added to the index once at the end.
+    Every chunk of the file gets its row and index entry; a chunk whose text was already
+    embedded (earlier in the file, or indexed in any scope) reuses that vector instead of
+    being re-encoded.
+    """
+    duplicate = _find_indexed_duplicate(db, job, file)
+    if duplicate is not None:
+        n_chunks = db.query(DocumentChunk).filter(DocumentChunk.file_id == duplicate.id).count()
+        path = Path(file.file_path)
+        job.file_id = duplicate.id
+        db.delete(file)
+        _update(
+            db, job, status="done", stage=None,
+            chunks_total=n_chunks, chunks_done=n_chunks, chunks_deduped=n_chunks,
+        )
+        path.unlink(missing_ok=True)
+        _record_dedup(files=1, duplicate_files=1, chunks=n_chunks, chunks_deduped=n_chunks)
+        logger.info("Ingestion job %s: duplicate of file %s, nothing to index", job.id, duplicate.id)
+        return
+
+    chunks = iter_chunks(iter_text_from_file(Path(file.file_path)))
+    # text hash -> vector, for every chunk of this file so far
+    known: dict[str, np.ndarray] = {}
+    chunk_ids: list[int] = []
+    chunk_texts: list[str] = []
+    vectors: list[np.ndarray] = []
+    total = deduped = 0
+    try:
+        for batch in _batches(chunks, INGESTION_EMBED_BATCH):
+            if _stopping.is_set():
+                raise IngestionInterrupted()
+            _heartbeat(db, job)
+            hashes = [text_hash(c) for c in batch]
+            known.update(_match_chunk_hashes(db, file.id, [h for h in hashes if h not in known]))
+            chunk_records = [
+                DocumentChunk(file_id=file.id, chunk_text=t, text_hash=h, chunk_index=i)
+                for i, (t, h) in enumerate(zip(batch, hashes), start=total)
+            ]
+            total += len(batch)
+            db.add_all(chunk_records)
+            _update(db, job, stage="embed", chunks_total=total)
+
+            # Duplicates within the batch are encoded once
+            missing = {h: t for t, h in zip(batch, hashes) if h not in known}
+            if missing:
+                known.update(zip(missing, np.asarray(encode(list(missing.values())), dtype=np.float32)))
+            deduped += len(batch) - len(missing)
+            vectors.extend(known[h] for h in hashes)
+            chunk_ids.extend(c.id for c in chunk_records)
+            chunk_texts.extend(batch)
+            _update(db, job, chunks_done=total, chunks_deduped=deduped)
+    except ExtractionError as e:
+        raise IngestionError(str(e)) from e
+    if not total:
+        raise IngestionError("Could not extract text from file")
+
+    if chunk_ids:
+        _update(db, job, stage="index")
+        add_vectors_to_index(job.scope, job.scope_id, np.array(vectors, dtype=np.float32), chunk_ids)
+        if RAG_HYBRID_SEARCH:
+            add_documents(job.scope, job.scope_id, chunk_ids, chunk_texts)
+        invalidate_answer_cache(job.scope, job.scope_id)
+    _update(db, job, status="done", stage=None)
+    _record_dedup(files=1, chunks=total, chunks_deduped=deduped)
+    logger.info(
+        "Ingestion job %s: %d chunks, %d deduplicated (%.0f%%)",
+        job.id, total, deduped, 100.0 * deduped / total,
+    )
+
+
+def run_ingestion_job(job_id: int) -> None:
+    """Run one job to completion. Blocking; workers call it in a thread.
+    Does nothing unless the job can be claimed (another process may own it).
+    On failure the job is marked failed and the upload (file, chunks, vectors) is removed.
+    A job interrupted by shutdown goes back to 'queued' with its file, and is redone.
+    """
+    db = SessionLocal()
+    try:
+        if not _claim(db, job_id):
+            return
+        job = db.get(IngestionJob, job_id)
+        file = db.get(File, job.file_id) if job.file_id else None
+        if file is None:
+            _update(db, job, status="failed", stage=None, error="Uploaded file is missing")
+            return
+        _discard_chunks(db, job, file.id)
+        try:
+            _ingest(db, job, file)
+        except Exception as e:
+            db.rollback()
+            if isinstance(e, _LeaseLost):
+                logger.warning("Ingestion job %s was taken over by another worker, abandoned", job_id)
+                return
+            if isinstance(e, (IngestionInterrupted, EmbeddingShutdownError)) or _stopping.is_set():
+                _release(db, job_id)
+                logger.info("Ingestion job %s interrupted by shutdown, re-queued", job_id)
+                return
+            if isinstance(e, IngestionError):
+                error = str(e)
+            else:
+                logger.exception("Ingestion job %s failed", job_id)
+                error = "Internal error while indexing file"
+            _discard_chunks(db, job, file.id)
+            path = Path(file.file_path)
+            job.file_id = None
+            db.delete(file)
+            _update(db, job, status="failed", stage=None, error=error)
+            path.unlink(missing_ok=True)
+    finally:
+        db.close()
+
+
+def _pending_job_ids(expired_only: bool = False) -> list[int]:
+    """Claimable jobs (queued, or running with an expired lease); only the latter if expired_only."""
+    db = SessionLocal()
+    try:
+        condition = _claimable() & (IngestionJob.status == "running") if expired_only else _claimable()
+        rows = db.query(IngestionJob.id).filter(condition).order_by(IngestionJob.id).all()
+        return [job_id for (job_id,) in rows]
+    finally:
+        db.close()
+
+
+async def _worker() -> None:
+    while True:
+        job_id = await _queue.get()
+        try:
+            await asyncio.to_thread(run_ingestion_job, job_id)
+        except Exception:
+            logger.exception("Ingestion worker crashed on job %s", job_id)
+        finally:
+            _queue.task_done()
+
+
+async def _requeue_expired() -> None:
+    """Periodically queue running jobs whose process died (lease expired without heartbeats)."""
+    while True:
+        await asyncio.sleep(INGESTION_LEASE_SECONDS / 2)
+        try:
+            expired = await asyncio.to_thread(_pending_job_ids, True)
+        except Exception:
+            logger.exception("Could not check for abandoned ingestion jobs")
+            continue
+        for job_id in expired:
+            _queue.put_nowait(job_id)
+        if expired:
+            logger.info("Taking over %d abandoned ingestion job(s)", len(expired))
+
+
+def enqueue_ingestion_job(job_id: int) -> None:
+    """Hand a persisted job to the worker pool. If workers aren't running, it's picked up on next start."""
+    if _queue is not None:
+        _queue.put_nowait(job_id)
+
+
+async def start_ingestion_workers() -> None:
+    """Start the worker pool and queue claimable jobs: queued ones (another live process may
+    claim them first) and running ones whose owner stopped heartbeating.
+    """
+    global _queue, _reaper
+    _stopping.clear()
+    _queue = asyncio.Queue()
+    try:
+        pending = await asyncio.to_thread(_pending_job_ids)
+    except Exception:
+        logger.exception("Could not load pending ingestion jobs")
+        pending = []
+    for job_id in pending:
+        _queue.put_nowait(job_id)
+    if pending:
+        logger.info("Resuming %d ingestion job(s)", len(pending))
+    for i in range(INGESTION_WORKERS):
+        _workers.append(asyncio.create_task(_worker(), name=f"ingestion-worker-{i}"))
+    _reaper = asyncio.create_task(_requeue_expired(), name="ingestion-lease-reaper")
+
+
+async def stop_ingestion_workers() -> None:
+    """Cancel workers. A job mid-flight goes back to 'queued' at its next batch and is resumed.
+    Call before stop_embedding_batcher, so a job cut off from the model isn't marked failed.
+    """
+    global _queue, _reaper
+    _stopping.set()
+    tasks = _workers + ([_reaper] if _reaper is not None else [])
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _reaper = None
+    _workers.clear()
+    _queue = None
@@ -0,0 +1,352 @@
+"""BM25 lexical index per course/group, kept next to the FAISS index under vector_indexes/.
+
+Catches exact matches embeddings miss: course codes, formula names, assignment numbers.
+Each scope is a directory of immutable segments plus a manifest:
+
+    course_12.lex/manifest.json     segments and their doc counts + tombstoned chunk ids (replaced atomically)
+    course_12.lex/seg_000003.npz    doc ids/lengths, sorted term dictionary, postings (doc, tf)
+
+Uploads add a segment; deletes add tombstones. Past LEXICAL_INDEX_MAX_SEGMENTS segments
+(or when tombstones pile up) all segments are merged into one, dropping tombstoned docs.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import List, Literal, NamedTuple
+
+import numpy as np
+
+from app.ai.file_locks import locked
+from app.config import LEXICAL_INDEX_MAX_SEGMENTS, VECTOR_INDEX_DIR
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Merge segments once this fraction of indexed docs is tombstoned
+_TOMBSTONE_COMPACT_RATIO = 0.2
+_CACHED_SCOPES = 64
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric runs: "CS101 Assignment-3" -> ["cs101", "assignment", "3"]."""
+    return _TOKEN.findall(text.lower())
+
+
+class _Segment(NamedTuple):
+    doc_ids: np.ndarray  # int64 chunk ids
+    doc_lens: np.ndarray  # int32 tokens per doc
+    terms: dict[str, tuple[int, int]]  # term -> [start, end) into postings
+    post_docs: np.ndarray  # int32 row into doc_ids
+    post_tfs: np.ndarray  # uint16 term frequency
+
+
+class _LoadedIndex(NamedTuple):
+    stamp: tuple[int, int, int]
+    segments: list[_Segment]
+    tombstones: np.ndarray
+
+
+def _index_dir(scope: Literal["course", "group"], scope_id: int) -> Path:
+    return VECTOR_INDEX_DIR / f"{scope}_{scope_id}.lex"
+
+
+def _manifest_path(scope: Literal["course", "group"], scope_id: int) -> Path:
+    return _index_dir(scope, scope_id) / "manifest.json"
+
+
+def _read_manifest(scope: Literal["course", "group"], scope_id: int) -> dict:
+    try:
+        return json.loads(_manifest_path(scope, scope_id).read_text())
+    except FileNotFoundError:
+        return {"segments": [], "docs": [], "next": 1, "tombstones": []}
+
+
+def _doc_counts(scope: Literal["course", "group"], scope_id: int, manifest: dict) -> List[int]:
+    """Docs per segment, from the manifest (read from the segments for manifests written before it kept them)."""
+    counts = manifest.get("docs")
+    if counts is not None and len(counts) == len(manifest["segments"]):
+        return counts
+    counts = []
+    for name in manifest["segments"]:
+        with np.load(_index_dir(scope, scope_id) / name) as data:
+            counts.append(int(data["doc_ids"].size))
+    return counts
+
+
+def _write_manifest(scope: Literal["course", "group"], scope_id: int, manifest: dict) -> None:
+    """Write to a temp file then rename, so readers never see a half-written manifest."""
+    path = _manifest_path(scope, scope_id)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(manifest))
+    os.replace(tmp_path, path)
+
+
+def _write_segment(path: Path, doc_ids, doc_lens, vocab: List[str], post_terms, post_docs, post_tfs) -> None:
+    """Postings given as parallel (term id into vocab, doc row, tf) arrays, in any order.
+    Terms stay integer ids until the vocabulary is written: a fixed-width string array of
+    postings would cost the longest token (a hex blob, a URL) for every posting.
+    """
+    post_terms = np.asarray(post_terms, dtype=np.int64)
+    used = np.unique(post_terms)
+    # Renumber the used terms in sorted term order
+    by_term = sorted(range(len(used)), key=lambda i: vocab[used[i]])
+    rank = np.empty(len(used), dtype=np.int64)
+    rank[by_term] = np.arange(len(used))
+    codes = rank[np.searchsorted(used, post_terms)]
+    order = np.lexsort((post_docs, codes))
+    codes, post_docs, post_tfs = codes[order], np.asarray(post_docs)[order], np.asarray(post_tfs)[order]
+    blob = "\n".join(vocab[used[i]] for i in by_term).encode("utf-8")
+    tmp_path = path.with_name(path.name + ".tmp.npz")
+    np.savez_compressed(
+        tmp_path,
+        doc_ids=np.asarray(doc_ids, dtype=np.int64),
+        doc_lens=np.asarray(doc_lens, dtype=np.int32),
+        vocab=np.frombuffer(blob, dtype=np.uint8),
+        term_starts=np.searchsorted(codes, np.arange(len(used) + 1)).astype(np.int64),
+        post_docs=post_docs.astype(np.int32),
+        post_tfs=np.minimum(post_tfs, np.iinfo(np.uint16).max).astype(np.uint16),
+    )
+    os.replace(tmp_path, path)
+
+
+def _read_segment(path: Path) -> _Segment:
+    with np.load(path) as data:
+        vocab = data["vocab"].tobytes().decode("utf-8").split("\n") if data["vocab"].size else []
+        starts = data["term_starts"]
+        terms = {term: (int(starts[i]), int(starts[i + 1])) for i, term in enumerate(vocab)}
+        return _Segment(data["doc_ids"], data["doc_lens"], terms, data["post_docs"], data["post_tfs"])
+
+
+def _segment_postings(segment: _Segment) -> tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """Expand a segment back to its vocab and parallel (term id, doc row, tf) arrays (for merging)."""
+    counts = np.array([end - start for start, end in segment.terms.values()], dtype=np.int64)
+    return list(segment.terms), np.repeat(np.arange(len(counts)), counts), segment.post_docs, segment.post_tfs
+
+
+# (scope, scope_id) -> loaded segments, least recently used first
+_loaded: "OrderedDict[tuple[str, int], _LoadedIndex]" = OrderedDict()
+_loaded_lock = threading.Lock()
+
+
+def _scope_lock(scope: str, scope_id: int):
+    """Serializes writers of a scope's manifest, across threads and processes."""
+    return locked(VECTOR_INDEX_DIR / f"{scope}_{scope_id}.lex.lock")
+
+
+def _load(scope: Literal["course", "group"], scope_id: int) -> _LoadedIndex | None:
+    """Segments of a scope, reloaded whenever the manifest changed (in any process)."""
+    try:
+        st = _manifest_path(scope, scope_id).stat()
+    except FileNotFoundError:
+        return None
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    key = (scope, scope_id)
+    with _loaded_lock:
+        entry = _loaded.get(key)
+        if entry is not None and entry.stamp == stamp:
+            _loaded.move_to_end(key)
+            return entry
+    manifest = _read_manifest(scope, scope_id)
+    directory = _index_dir(scope, scope_id)
+    try:
+        segments = [_read_segment(directory / name) for name in manifest["segments"]]
+    except FileNotFoundError:
+        # Compacted by another process between reading the manifest and its segments
+        manifest = _read_manifest(scope, scope_id)
+        segments = [_read_segment(directory / name) for name in manifest["segments"]]
+    entry = _LoadedIndex(stamp, segments, np.array(manifest["tombstones"], dtype=np.int64))
+    with _loaded_lock:
+        _loaded[key] = entry
+        _loaded.move_to_end(key)
+        while len(_loaded) > _CACHED_SCOPES:
+            _loaded.popitem(last=False)
+    return entry
+
+
+def _compact(scope: Literal["course", "group"], scope_id: int, manifest: dict) -> dict:
+    """Merge every segment into one, dropping tombstoned docs. Caller holds the scope lock."""
+    directory = _index_dir(scope, scope_id)
+    tombstones = np.array(manifest["tombstones"], dtype=np.int64)
+    doc_ids, doc_lens, terms, docs, tfs = [], [], [], [], []
+    vocab: dict[str, int] = {}
+    n_docs = 0
+    for name in manifest["segments"]:
+        segment = _read_segment(directory / name)
+        live = ~np.isin(segment.doc_ids, tombstones)
+        # Old row -> new row for live docs
+        remap = np.cumsum(live) - 1 + n_docs
+        seg_vocab, seg_terms, seg_docs, seg_tfs = _segment_postings(segment)
+        # Segment term id -> merged term id
+        term_ids = np.array([vocab.setdefault(term, len(vocab)) for term in seg_vocab], dtype=np.int64)
+        keep = live[seg_docs]
+        terms.append(term_ids[seg_terms[keep]])
+        docs.append(remap[seg_docs[keep]])
+        tfs.append(seg_tfs[keep])
+        doc_ids.append(segment.doc_ids[live])
+        doc_lens.append(segment.doc_lens[live])
+        n_docs += int(live.sum())
+    old_segments = manifest["segments"]
+    name = f"seg_{manifest['next']:06d}.npz"
+    if n_docs:
+        _write_segment(
+            directory / name,
+            np.concatenate(doc_ids), np.concatenate(doc_lens), list(vocab),
+            np.concatenate(terms), np.concatenate(docs), np.concatenate(tfs),
+        )
+    manifest = {
+        "segments": [name] if n_docs else [], "docs": [n_docs] if n_docs else [],
+        "next": manifest["next"] + 1, "tombstones": [],
+    }
+    _write_manifest(scope, scope_id, manifest)
+    for old in old_segments:
+        (directory / old).unlink(missing_ok=True)
+    return manifest
+
+
+def _maybe_compact(scope: Literal["course", "group"], scope_id: int, manifest: dict) -> dict:
+    n_docs = sum(manifest["docs"])
+    too_many = len(manifest["segments"]) > LEXICAL_INDEX_MAX_SEGMENTS
+    too_dead = n_docs and len(manifest["tombstones"]) > _TOMBSTONE_COMPACT_RATIO * n_docs
+    if too_many or too_dead:
+        return _compact(scope, scope_id, manifest)
+    return manifest
+
+
+def _write_documents(path: Path, chunk_ids: List[int], texts: List[str]) -> None:
+    vocab: dict[str, int] = {}
+    terms, docs, tfs, lens = [], [], [], []
+    for row, text in enumerate(texts):
+        tokens = tokenize(text)
+        lens.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            terms.append(vocab.setdefault(term, len(vocab)))
+            docs.append(row)
+            tfs.append(tf)
+    _write_segment(
+        path, chunk_ids, lens, list(vocab),
+        np.array(terms, dtype=np.int64), np.array(docs, dtype=np.int32), np.array(tfs, dtype=np.int64),
+    )
+
+
+def add_documents(scope: Literal["course", "group"], scope_id: int, chunk_ids: List[int], texts: List[str]) -> None:
+    """Index chunk texts as a new segment (one per upload)."""
+    if not chunk_ids:
+        return
+    with _scope_lock(scope, scope_id):
+        directory = _index_dir(scope, scope_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        manifest = _read_manifest(scope, scope_id)
+        manifest["docs"] = _doc_counts(scope, scope_id, manifest)
+        name = f"seg_{manifest['next']:06d}.npz"
+        _write_documents(directory / name, chunk_ids, texts)
+        # Re-added ids (e.g. a retried upload) are live again
+        readded = set(chunk_ids)
+        manifest["tombstones"] = [cid for cid in manifest["tombstones"] if cid not in readded]
+        manifest["segments"].append(name)
+        manifest["docs"].append(len(chunk_ids))
+        manifest["next"] += 1
+        _write_manifest(scope, scope_id, manifest)
+        _maybe_compact(scope, scope_id, manifest)
+
+
+def remove_documents(scope: Literal["course", "group"], scope_id: int, chunk_ids: List[int]) -> None:
+    """Tombstone chunk ids; they are dropped from disk at the next compaction."""
+    if not chunk_ids or not _manifest_path(scope, scope_id).exists():
+        return
+    with _scope_lock(scope, scope_id):
+        manifest = _read_manifest(scope, scope_id)
+        manifest["docs"] = _doc_counts(scope, scope_id, manifest)
+        manifest["tombstones"] = sorted(set(manifest["tombstones"]) | {int(c) for c in chunk_ids})
+        _write_manifest(scope, scope_id, manifest)
+        _maybe_compact(scope, scope_id, manifest)
+
+
+def rebuild_index(scope: Literal["course", "group"], scope_id: int, chunk_ids: List[int], texts: List[str]) -> None:
+    """Replace a scope's whole lexical index with the given chunks (backfill / maintenance)."""
+    with _scope_lock(scope, scope_id):
+        directory = _index_dir(scope, scope_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        manifest = _read_manifest(scope, scope_id)
+        name = f"seg_{manifest['next']:06d}.npz"
+        if chunk_ids:
+            _write_documents(directory / name, chunk_ids, texts)
+        _write_manifest(scope, scope_id, {
+            "segments": [name] if chunk_ids else [], "docs": [len(chunk_ids)] if chunk_ids else [],
+            "next": manifest["next"] + 1, "tombstones": [],
+        })
+        for old in manifest["segments"]:
+            (directory / old).unlink(missing_ok=True)
+
+
+def compact_index(scope: Literal["course", "group"], scope_id: int) -> None:
+    """Merge all segments now and remove temp files of interrupted writes (maintenance)."""
+    if not _manifest_path(scope, scope_id).exists():
+        return
+    with _scope_lock(scope, scope_id):
+        for tmp_path in _manifest_path(scope, scope_id).parent.glob("*.tmp*"):
+            tmp_path.unlink(missing_ok=True)
+        _compact(scope, scope_id, _read_manifest(scope, scope_id))
+
+
+def get_indexed_ids(scope: Literal["course", "group"], scope_id: int) -> np.ndarray | None:
+    """Live (not tombstoned) chunk ids in a scope's lexical index. None if there is no index."""
+    entry = _load(scope, scope_id)
+    if entry is None:
+        return None
+    ids = np.concatenate([s.doc_ids for s in entry.segments]) if entry.segments else np.empty(0, dtype=np.int64)
+    return ids[~np.isin(ids, entry.tombstones)]
+
+
+def has_lexical_index(scope: Literal["course", "group"], scope_id: int) -> bool:
+    return _manifest_path(scope, scope_id).exists()
+
+
+def search_lexical(
+    scope: Literal["course", "group"],
+    scope_id: int,
+    query: str,
+    top_k: int = 5,
+) -> tuple[List[int], List[float]]:
+    """BM25 search. Returns (chunk ids, scores), best first; empty if the scope has no index."""
+    entry = _load(scope, scope_id)
+    terms = set(tokenize(query))
+    if entry is None or not entry.segments or not terms or top_k <= 0:
+        return [], []
+    live = [~np.isin(s.doc_ids, entry.tombstones) for s in entry.segments]
+    # Collection statistics over live docs (df still counts tombstoned docs until compaction)
+    n_docs = sum(int(mask.sum()) for mask in live)
+    if n_docs == 0:
+        return [], []
+    avgdl = max(sum(float(s.doc_lens[mask].sum()) for s, mask in zip(entry.segments, live)) / n_docs, 1.0)
+    df = {t: sum(s.terms[t][1] - s.terms[t][0] for s in entry.segments if t in s.terms) for t in terms}
+    idf = {t: math.log(1 + (n_docs - n + 0.5) / (n + 0.5)) for t, n in df.items() if n}
+
+    all_ids, all_scores = [], []
+    for segment, mask in zip(entry.segments, live):
+        scores = np.zeros(segment.doc_ids.size, dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.doc_lens / avgdl)
+        for term, weight in idf.items():
+            span = segment.terms.get(term)
+            if span is None:
+                continue
+            docs = segment.post_docs[span[0]:span[1]]
+            tf = segment.post_tfs[span[0]:span[1]].astype(np.float32)
+            scores[docs] += weight * tf * (BM25_K1 + 1) / (tf + norm[docs])
+        hit = (scores > 0) & mask
+        all_ids.append(segment.doc_ids[hit])
+        all_scores.append(scores[hit])
+    ids = np.concatenate(all_ids)
+    scores = np.concatenate(all_scores)
+    if ids.size > top_k:
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        ids, scores = ids[top], scores[top]
+    order = np.argsort(-scores, kind="stable")
+    return ids[order].tolist(), scores[order].tolist()
@@ -1,9 +1,12 @@
 """Async Ollama client for local LLaMA."""
+import json
 import re
+from typing import AsyncIterator
 
 import httpx
 
 from app.config import OLLAMA_BASE_URL, OLLAMA_MODEL
+from app.http_clients import get_http_client
 
 
 class OllamaUnavailableError(Exception):
@@ -20,33 +23,113 @@ def strip_think_tags(text: str) -> str:
     return cleaned.strip()
 
 
+class _ThinkFilter:
+    """Incremental strip_think_tags for streamed text. Text that could be the start of a
+    tag is held back until the next chunk decides it; leading whitespace is dropped.
+    """
+
+    _OPEN, _CLOSE = "<think>", "</think>"
+
+    def __init__(self):
+        self._buf = ""
+        self._in_think = False
+        self._started = False
+
+    def _emit(self, text: str) -> str:
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+    def feed(self, text: str) -> str:
+        self._buf += text
+        out = []
+        while True:
+            tag = self._CLOSE if self._in_think else self._OPEN
+            i = self._buf.lower().find(tag)
+            if i < 0:
+                break
+            if not self._in_think:
+                out.append(self._buf[:i])
+            self._buf = self._buf[i + len(tag):]
+            self._in_think = not self._in_think
+        # Hold back the longest suffix that is a prefix of the tag we're looking for
+        lower = self._buf.lower()
+        keep = next((k for k in range(min(len(tag) - 1, len(lower)), 0, -1) if lower.endswith(tag[:k])), 0)
+        if not self._in_think:
+            out.append(self._buf[: len(self._buf) - keep])
+        self._buf = self._buf[len(self._buf) - keep:]
+        return self._emit("".join(out))
+
+    def flush(self) -> str:
+        text, self._buf = ("" if self._in_think else self._buf), ""
+        return self._emit(text)
+
+
+def _unavailable(e: httpx.HTTPError) -> OllamaUnavailableError:
+    """Map an httpx failure to the error the AI routes turn into a 503."""
+    if isinstance(e, httpx.ConnectError):
+        return OllamaUnavailableError(f"Ollama is not reachable at {OLLAMA_BASE_URL}. Is it running?")
+    if isinstance(e, httpx.TimeoutException):
+        return OllamaUnavailableError("Ollama request timed out.")
+    if isinstance(e, httpx.HTTPStatusError):
+        msg = str(e.response.text) if e.response else str(e)
+        if e.response and e.response.status_code == 404:
+            return OllamaUnavailableError(
+                f"Model '{OLLAMA_MODEL}' not found. Pull it with: ollama pull {OLLAMA_MODEL}"
+            )
+        return OllamaUnavailableError(f"Ollama error: {msg}")
+    return OllamaUnavailableError(f"Ollama error: {e}")
+
+
 async def generate(prompt: str, stream: bool = False) -> str:
     """Send prompt to Ollama, return generated text. Non-blocking.
     Raises OllamaUnavailableError if Ollama is down or model fails.
     """
-    url = f"{OLLAMA_BASE_URL.rstrip('/')}/api/generate"
     payload = {
         "model": OLLAMA_MODEL,
         "prompt": prompt,
         "stream": stream,
     }
     try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            resp = await client.post(url, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-    except httpx.ConnectError as e:
-        raise OllamaUnavailableError(
-            f"Ollama is not reachable at {OLLAMA_BASE_URL}. Is it running?"
-        ) from e
-    except httpx.TimeoutException as e:
-        raise OllamaUnavailableError("Ollama request timed out.") from e
-    except httpx.HTTPStatusError as e:
-        msg = str(e.response.text) if e.response else str(e)
-        if e.response and e.response.status_code == 404:
-            raise OllamaUnavailableError(
-                f"Model '{OLLAMA_MODEL}' not found. Pull it with: ollama pull {OLLAMA_MODEL}"
-            ) from e
-        raise OllamaUnavailableError(f"Ollama error: {msg}") from e
+        resp = await get_http_client("ollama").post("/api/generate", json=payload)
+        resp.raise_for_status()
+        data = resp.json()
+    except httpx.HTTPError as e:
+        raise _unavailable(e) from e
     raw = data.get("response", "").strip()
     return strip_think_tags(raw)
+
+
+async def generate_stream(prompt: str) -> AsyncIterator[str]:
+    """Stream the answer from Ollama as it is generated, with <think> blocks filtered out.
+    Reads Ollama's NDJSON stream line by line. Raises OllamaUnavailableError if Ollama
+    is down or the model fails, before the first chunk or mid-stream.
+    """
+    payload = {
+        "model": OLLAMA_MODEL,
+        "prompt": prompt,
+        "stream": True,
+    }
+    think = _ThinkFilter()
+    try:
+        async with get_http_client("ollama").stream("POST", "/api/generate", json=payload) as resp:
+            if resp.is_error:
+                await resp.aread()
+                resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise OllamaUnavailableError(f"Ollama error: {data['error']}")
+                text = think.feed(data.get("response", ""))
+                if text:
+                    yield text
+                if data.get("done"):
+                    break
+    except httpx.HTTPError as e:
+        raise _unavailable(e) from e
+    tail = think.flush()
+    if tail:
+        yield tail
@@ -1,15 +1,59 @@
-"""RAG: retrieve chunks, build prompt, call LLaMA."""
-from typing import List
+"""RAG: retrieve chunks, build prompt, call LLaMA.
+
+The prompt context is packed into RAG_CONTEXT_TOKEN_BUDGET: chunk overlaps are removed,
+materials are kept in relevance order and the chat window is trimmed oldest-first.
+
+Answers are kept in a per-scope semantic cache: a question whose embedding is within
+RAG_ANSWER_CACHE_SIMILARITY of a cached question gets the cached answer, as long as the
+scope's index version and the chat window it was answered from are unchanged.
+
+Retrieval is hybrid when RAG_HYBRID_SEARCH is on: FAISS and BM25 candidates are fused by
+reciprocal rank, so exact terms (course codes, assignment numbers) are found even when
+their embedding is not close to the question's. Group queries are federated over the group's
+and its parent course's indexes (RAG_FEDERATED_SEARCH). The candidates are re-ranked by
+maximal marginal relevance using their stored vectors (RAG_MMR), and retrieved chunks that
+are consecutive in a file are merged into one passage (RAG_MERGE_ADJACENT_CHUNKS).
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, List, NamedTuple
 
 import numpy as np
 from sqlalchemy.orm import Session
 
-from app.ai.embeddings import encode_single
-from app.ai.llama_client import generate
-from app.ai.vector_store import search_index
-from app.models import DocumentChunk
+from app.ai.embeddings import encode_async, encode_single_async
+from app.ai.lexical_index import search_lexical
+from app.ai.llama_client import generate, generate_stream
+from app.ai.text_utils import CHUNK_OVERLAP_CHARS
+from app.ai.vector_store import federated_search, get_index_version, get_vectors, search_index_batch
+from app.config import (
+    RAG_CONTEXT_TOKEN_BUDGET,
+    RAG_ANSWER_CACHE_MAX_SCOPES,
+    RAG_ANSWER_CACHE_PER_SCOPE,
+    RAG_ANSWER_CACHE_SIMILARITY,
+    RAG_ANSWER_CACHE_TTL_SECONDS,
+    RAG_CANDIDATE_K,
+    RAG_FEDERATED_SEARCH,
+    RAG_HYBRID_SEARCH,
+    RAG_MERGE_ADJACENT_CHUNKS,
+    RAG_MMR,
+    RAG_MMR_LAMBDA,
+    RAG_RRF_K,
+)
+from app.models import DocumentChunk, Group
+
+logger = logging.getLogger(__name__)
 
 RAG_TOP_K = 5
+CHARS_PER_TOKEN = 4
+# Shortest chunk overlap worth detecting, and the smallest truncated chunk worth including
+_MIN_OVERLAP_CHARS = 32
+_MIN_PARTIAL_TOKENS = 100
 PROMPT_TEMPLATE = """Using the following context (recent course discussion and/or uploaded materials), answer the question. If the answer is not found in the context, say you don't know.
 
 Context:
@@ -19,13 +63,476 @@ Question:
 {question}"""
 
 
+def _chunk_texts_map(db: Session, chunk_ids: List[int]) -> dict[int, str]:
+    """chunk id -> text in one query; ids of deleted chunks are absent."""
+    if not chunk_ids:
+        return {}
+    rows = db.query(DocumentChunk.id, DocumentChunk.chunk_text).filter(DocumentChunk.id.in_(chunk_ids)).all()
+    return {r.id: r.chunk_text for r in rows}
+
+
 def get_chunk_texts_by_ids(db: Session, chunk_ids: List[int]) -> List[str]:
     """Fetch chunk texts by ids. Preserves order of chunk_ids."""
+    id_to_text = _chunk_texts_map(db, chunk_ids)
+    return [id_to_text[cid] for cid in chunk_ids if cid in id_to_text]
+
+
+def _join_adjacent(first: str, second: str) -> str:
+    """Concatenate consecutive chunks of a file, dropping the text they share."""
+    cut = _overlap(first, second)
+    return first + second[cut:] if cut else f"{first}\n{second}"
+
+
+def merge_adjacent_chunks(db: Session, chunk_ids: List[int]) -> List[str]:
+    """Texts of chunk_ids (relevance order), with chunks that are consecutive in the same file
+    merged into one passage in file order, placed at the rank of its best chunk.
+    """
     if not chunk_ids:
         return []
-    chunks = db.query(DocumentChunk).filter(DocumentChunk.id.in_(chunk_ids)).all()
-    id_to_chunk = {c.id: c for c in chunks}
-    return [id_to_chunk[cid].chunk_text for cid in chunk_ids if cid in id_to_chunk]
+    rows = (
+        db.query(DocumentChunk.id, DocumentChunk.file_id, DocumentChunk.chunk_index, DocumentChunk.chunk_text)
+        .filter(DocumentChunk.id.in_(chunk_ids))
+        .all()
+    )
+    rank = {chunk_id: i for i, chunk_id in enumerate(chunk_ids)}
+    # Runs of consecutive positions within a file: (best rank, text)
+    runs: List[tuple[int, str]] = []
+    by_file: dict[int, list] = {}
+    for row in rows:
+        if row.chunk_index is None:
+            runs.append((rank[row.id], row.chunk_text))
+        else:
+            by_file.setdefault(row.file_id, []).append(row)
+    for file_rows in by_file.values():
+        file_rows.sort(key=lambda r: r.chunk_index)
+        best, text, last = rank[file_rows[0].id], file_rows[0].chunk_text, file_rows[0].chunk_index
+        for row in file_rows[1:]:
+            if row.chunk_index == last + 1:
+                best, text = min(best, rank[row.id]), _join_adjacent(text, row.chunk_text)
+            else:
+                runs.append((best, text))
+                best, text = rank[row.id], row.chunk_text
+            last = row.chunk_index
+        runs.append((best, text))
+    runs.sort(key=lambda run: run[0])
+    return [text for _, text in runs]
+
+
+def _rrf_scores(rankings: List[List[int]], k: int = RAG_RRF_K) -> dict[int, float]:
+    scores: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], top_k: int, k: int = RAG_RRF_K) -> List[int]:
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank), rank from 1."""
+    scores = _rrf_scores(rankings, k)
+    return sorted(scores, key=scores.__getitem__, reverse=True)[:top_k]
+
+
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, top_k: int, lambda_: float = RAG_MMR_LAMBDA) -> List[int]:
+    """Greedy maximal marginal relevance over candidates: repeatedly pick the row maximizing
+    lambda * relevance - (1 - lambda) * (max cosine similarity to the rows already picked).
+    vectors are the candidates' embeddings (zero rows for unknown ones). Returns row indices.
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.maximum(norms, 1e-12)
+    similarity = unit @ unit.T
+    redundancy = np.zeros(len(relevance), dtype=np.float32)
+    available = np.ones(len(relevance), dtype=bool)
+    picked: List[int] = []
+    for _ in range(min(top_k, len(relevance))):
+        scores = np.where(available, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return picked
+
+
+def _candidate_vectors(scopes: List[tuple[str, int]], chunk_ids: List[int]) -> np.ndarray:
+    """Stored embeddings of chunk_ids, looked up in each scope index in turn."""
+    vectors = None
+    missing = np.ones(len(chunk_ids), dtype=bool)
+    for scope, scope_id in scopes:
+        rows = np.flatnonzero(missing)
+        found_vectors, found = get_vectors(scope, scope_id, [chunk_ids[r] for r in rows])
+        if not found.any():
+            continue
+        if vectors is None:
+            vectors = np.zeros((len(chunk_ids), found_vectors.shape[1]), dtype=np.float32)
+        vectors[rows[found]] = found_vectors[found]
+        missing[rows[found]] = False
+        if not missing.any():
+            break
+    return vectors if vectors is not None else np.zeros((len(chunk_ids), 1), dtype=np.float32)
+
+
+# group id -> parent course id (never changes once a group exists)
+_parent_course_ids: dict[int, int] = {}
+
+
+def search_scopes(db: Session, scope: str, scope_id: int) -> List[tuple[str, int]]:
+    """Indexes a scope's questions are answered from: the scope itself first, then (for a group,
+    when federated search is on) its parent course.
+    """
+    if scope != "group":
+        return [("course", scope_id)]
+    if not RAG_FEDERATED_SEARCH:
+        return [("group", scope_id)]
+    course_id = _parent_course_ids.get(scope_id)
+    if course_id is None:
+        course_id = db.query(Group.course_id).filter(Group.id == scope_id).scalar()
+        if course_id is None:
+            return [("group", scope_id)]
+        _parent_course_ids[scope_id] = course_id
+    return [("group", scope_id), ("course", course_id)]
+
+
+def search_chunk_ids(
+    scopes: List[tuple[str, int]],
+    query: str | None,
+    query_vec: List[float],
+    top_k: int,
+    hybrid: bool = RAG_HYBRID_SEARCH,
+    mmr: bool = RAG_MMR,
+) -> List[int]:
+    """Top chunk ids for a query over one or more scope indexes: vector search (merged by
+    distance across scopes), fused with BM25 when hybrid and query is given, then re-ranked
+    by MMR over RAG_CANDIDATE_K candidates so near-duplicate chunks don't crowd out others.
+    """
+    query_vec_np = np.array([query_vec], dtype=np.float32)
+    fuse = hybrid and bool(query)
+    candidates = max(top_k, RAG_CANDIDATE_K) if fuse or mmr else top_k
+    hits = federated_search(scopes, query_vec_np, top_k=candidates)
+    if len(scopes) > 1:
+        sources = {f"{s}_{sid}": sum(h.scope == s and h.scope_id == sid for h in hits[:top_k]) for s, sid in scopes}
+        logger.debug("Federated vector hits: %s", sources)
+    ranked = [hit.chunk_id for hit in hits]
+    fused_scores = None
+    if fuse:
+        # BM25 scores are merged across scopes like distances (each scope has its own collection statistics)
+        lexical = []
+        for scope, scope_id in scopes:
+            ids, scores = search_lexical(scope, scope_id, query, top_k=candidates)
+            lexical.extend(zip(scores, ids))
+        if lexical:
+            lexical_ids = [chunk_id for _, chunk_id in sorted(lexical, reverse=True)[:candidates]]
+            fused_scores = _rrf_scores([ranked, lexical_ids])
+            ranked = sorted(fused_scores, key=fused_scores.__getitem__, reverse=True)[:candidates]
+    if not mmr or len(ranked) <= top_k:
+        return ranked[:top_k]
+
+    vectors = _candidate_vectors(scopes, ranked)
+    if fused_scores is not None:
+        # Relevance from the fused ranking, so lexical-only matches keep their place
+        relevance = np.array([fused_scores[c] for c in ranked], dtype=np.float32)
+        relevance /= relevance.max()
+    else:
+        q = query_vec_np[0] / max(float(np.linalg.norm(query_vec_np[0])), 1e-12)
+        relevance = (vectors @ q) / np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+    return [ranked[i] for i in mmr_select(relevance, vectors, top_k)]
+
+
+async def _search_chunk_texts(
+    db: Session, scope: str, scope_id: int, query: str | None, query_vec: List[float], top_k: int
+) -> List[str]:
+    # Index search blocks (disk loads, waiting on the federated scopes): keep it off the event loop
+    scopes = search_scopes(db, scope, scope_id)
+    chunk_ids = await asyncio.to_thread(search_chunk_ids, scopes, query, query_vec, top_k)
+    if RAG_MERGE_ADJACENT_CHUNKS:
+        return merge_adjacent_chunks(db, chunk_ids)
+    return get_chunk_texts_by_ids(db, chunk_ids)
+
+
+async def retrieve_chunk_texts(
+    db: Session,
+    scope: str,
+    scope_id: int,
+    query: str,
+    top_k: int = RAG_TOP_K,
+) -> List[str]:
+    """Embed query and return the texts of the top_k best matching chunks in the scope's index."""
+    query_vec = await encode_single_async(query)
+    return await _search_chunk_texts(db, scope, scope_id, query, query_vec, top_k)
+
+
+class RetrievedChunk(NamedTuple):
+    chunk_id: int
+    text: str
+    distance: float  # squared L2 to the query (lower is closer)
+    scope: str
+
+
+async def retrieve_chunks_batch(
+    db: Session,
+    scope: str,
+    scope_id: int,
+    queries: List[str],
+    top_k: int = RAG_TOP_K,
+    max_distance: float | None = None,
+) -> List[List[RetrievedChunk]]:
+    """Nearest chunks for several queries at once: the queries are embedded together, each
+    index is searched once for all of them and every chunk text is fetched in one DB query.
+    Vector search only, so each hit carries a distance that max_distance can cut off.
+    """
+    if not queries:
+        return []
+    matrix = np.array(await encode_async(queries), dtype=np.float32)
+    per_query: List[List[tuple[float, int, str]]] = [[] for _ in queries]
+    for scope_type, sid in search_scopes(db, scope, scope_id):
+        results = await asyncio.to_thread(search_index_batch, scope_type, sid, matrix, top_k, max_distance)
+        for hits, result in zip(per_query, results):
+            hits.extend(zip(result.distances, result.chunk_ids, [scope_type] * len(result.chunk_ids)))
+    for hits in per_query:
+        hits.sort()
+        del hits[top_k:]
+    texts = _chunk_texts_map(db, list({chunk_id for hits in per_query for _, chunk_id, _ in hits}))
+    return [
+        [RetrievedChunk(chunk_id, texts[chunk_id], distance, source) for distance, chunk_id, source in hits if chunk_id in texts]
+        for hits in per_query
+    ]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 chars per token for English with a BPE tokenizer)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of a that is also a prefix of b (chunk_text overlap)."""
+    tail = a[-2 * CHUNK_OVERLAP_CHARS:]
+    probe = b[:_MIN_OVERLAP_CHARS]
+    if len(probe) < _MIN_OVERLAP_CHARS:
+        return 0
+    pos = tail.find(probe)
+    while pos >= 0:
+        if b.startswith(tail[pos:]):
+            return len(tail) - pos
+        pos = tail.find(probe, pos + 1)
+    return 0
+
+
+def _dedupe_chunks(chunk_texts: List[str]) -> List[str]:
+    """Drop repeated chunks and trim text shared with an earlier-kept neighbouring chunk."""
+    kept: List[str] = []
+    for text in chunk_texts:
+        if any(text in k for k in kept):
+            continue
+        for k in kept:
+            text = text[_overlap(k, text):]
+            cut = _overlap(text, k)
+            if cut:
+                text = text[:-cut]
+        text = text.strip()
+        if text:
+            kept.append(text)
+    return kept
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    cut = text[:max_chars]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > max_chars // 2 else cut).rstrip() + " ..."
+
+
+def pack_context(chunk_texts: List[str], chat_lines: List[str], budget_tokens: int) -> tuple[List[str], List[str]]:
+    """Fit materials (relevance order) and chat (chronological) into budget_tokens.
+    Chat gets the newest lines up to a third of the budget, materials fill what's left
+    (the last one truncated if worthwhile), and any remainder goes to older chat lines.
+    Returns (materials, chat_lines) to include.
+    """
+    chat_costs = [estimate_tokens(line) + 1 for line in chat_lines]
+    chat_budget = min(sum(chat_costs), budget_tokens // 3)
+    n_chat = 0
+    used = 0
+    for cost in reversed(chat_costs):
+        if used + cost > chat_budget:
+            break
+        used += cost
+        n_chat += 1
+
+    materials = []
+    remaining = budget_tokens - used
+    for text in _dedupe_chunks(chunk_texts):
+        cost = estimate_tokens(text) + 1
+        if cost <= remaining:
+            materials.append(text)
+            remaining -= cost
+        else:
+            if remaining >= _MIN_PARTIAL_TOKENS:
+                materials.append(_truncate(text, (remaining - 1) * CHARS_PER_TOKEN))
+                remaining = 0
+            break
+
+    for cost in reversed(chat_costs[: len(chat_costs) - n_chat]):
+        if cost > remaining:
+            break
+        remaining -= cost
+        n_chat += 1
+    return materials, chat_lines[len(chat_lines) - n_chat:] if n_chat else []
+
+
+class _CachedAnswer(NamedTuple):
+    question_vec: np.ndarray  # unit length
+    answer: str
+    index_version: str | None
+    chat_hash: str
+    expires_at: float
+
+
+class _AnswerCache:
+    """Per-scope semantic answer cache. Scopes are LRU-bounded; each scope keeps its
+    most recent RAG_ANSWER_CACHE_PER_SCOPE answers.
+    """
+
+    def __init__(self, ttl: float, similarity: float, per_scope: int, max_scopes: int):
+        self._ttl = ttl
+        self._similarity = similarity
+        self._per_scope = per_scope
+        self._max_scopes = max_scopes
+        self._scopes: "OrderedDict[tuple[str, int], list[_CachedAnswer]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self._ttl > 0
+
+    def get(self, scope: str, scope_id: int, question_vec: np.ndarray, index_version: str | None, chat_hash: str) -> str | None:
+        now = time.monotonic()
+        with self._lock:
+            entries = self._scopes.get((scope, scope_id), [])
+            live = [e for e in entries if e.expires_at > now]
+            self.stats["expired"] += len(entries) - len(live)
+            if len(live) != len(entries):
+                self._scopes[(scope, scope_id)] = live
+            candidates = [e for e in live if e.index_version == index_version and e.chat_hash == chat_hash]
+            if candidates:
+                sims = np.stack([e.question_vec for e in candidates]) @ question_vec
+                best = int(np.argmax(sims))
+                if sims[best] >= self._similarity:
+                    self._scopes.move_to_end((scope, scope_id))
+                    self.stats["hits"] += 1
+                    return candidates[best].answer
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, scope: str, scope_id: int, question_vec: np.ndarray, answer: str, index_version: str | None, chat_hash: str) -> None:
+        entry = _CachedAnswer(question_vec, answer, index_version, chat_hash, time.monotonic() + self._ttl)
+        with self._lock:
+            entries = self._scopes.setdefault((scope, scope_id), [])
+            entries.append(entry)
+            if len(entries) > self._per_scope:
+                del entries[0]
+                self.stats["evictions"] += 1
+            self._scopes.move_to_end((scope, scope_id))
+            while len(self._scopes) > self._max_scopes:
+                _, dropped = self._scopes.popitem(last=False)
+                self.stats["evictions"] += len(dropped)
+            self.stats["stores"] += 1
+
+    def invalidate(self, scope: str, scope_id: int) -> None:
+        with self._lock:
+            if self._scopes.pop((scope, scope_id), None) is not None:
+                self.stats["invalidations"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["scopes"] = len(self._scopes)
+            stats["entries"] = sum(len(e) for e in self._scopes.values())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_answer_cache = _AnswerCache(
+    RAG_ANSWER_CACHE_TTL_SECONDS, RAG_ANSWER_CACHE_SIMILARITY, RAG_ANSWER_CACHE_PER_SCOPE, RAG_ANSWER_CACHE_MAX_SCOPES
+)
+
+
+def invalidate_answer_cache(scope: str, scope_id: int) -> None:
+    """Drop cached answers for a scope (new material was indexed)."""
+    _answer_cache.invalidate("course" if scope == "course" else "group", scope_id)
+
+
+def get_answer_cache_stats() -> dict:
+    """Hit/miss/eviction counters and hit rate of the semantic answer cache."""
+    return _answer_cache.snapshot()
+
+
+class _AnswerKey(NamedTuple):
+    scope: str
+    scope_id: int
+    question_vec: np.ndarray
+    index_version: str | None
+    chat_hash: str
+
+
+def _chat_hash(recent_chat_snippet: str | None) -> str:
+    return hashlib.sha256((recent_chat_snippet or "").strip().encode("utf-8")).hexdigest()
+
+
+def _index_version(db: Session | None, scope: str, scope_id: int) -> str:
+    """Version of every index the scope is answered from (parent course too, when federated)."""
+    scope_type = "course" if scope == "course" else "group"
+    if db is None:
+        return str(get_index_version(scope_type, scope_id))
+    return "+".join(str(get_index_version(s, sid)) for s, sid in search_scopes(db, scope_type, scope_id))
+
+
+def _answer_key(
+    db: Session, scope: str, scope_id: int, query_vec: List[float], recent_chat_snippet: str | None
+) -> _AnswerKey:
+    scope_type = "course" if scope == "course" else "group"
+    vec = np.asarray(query_vec, dtype=np.float32)
+    vec = vec / max(float(np.linalg.norm(vec)), 1e-12)
+    # Read before retrieval: if an upload lands mid-generation, the answer is stored under the old version
+    return _AnswerKey(scope_type, scope_id, vec, _index_version(db, scope, scope_id), _chat_hash(recent_chat_snippet))
+
+
+def get_context_version(
+    scope: str, scope_id: int, recent_chat_snippet: str | None = None, db: Session | None = None
+) -> str:
+    """Changes whenever the material or chat a scope's answers are built from changes.
+    Pass db for a group so its parent course's index is included.
+    """
+    return f"{_index_version(db, scope, scope_id)}|{_chat_hash(recent_chat_snippet)}"
+
+
+async def build_rag_prompt(
+    db: Session,
+    scope: str,
+    scope_id: int,
+    question: str,
+    recent_chat_snippet: str | None = None,
+    query_vec: List[float] | None = None,
+) -> str:
+    """Embed question (unless query_vec is given), retrieve top chunks and build the answer prompt."""
+    if query_vec is None:
+        query_vec = await encode_single_async(question)
+    chunk_texts = await _search_chunk_texts(db, scope, scope_id, question, query_vec, RAG_TOP_K)
+    chat_lines = recent_chat_snippet.strip().splitlines() if recent_chat_snippet and recent_chat_snippet.strip() else []
+    materials, chat_lines_kept = pack_context(chunk_texts, chat_lines, RAG_CONTEXT_TOKEN_BUDGET)
+
+    parts = []
+    if chat_lines_kept:
+        parts.append("Recent course discussion:\n" + "\n".join(chat_lines_kept))
+    if materials:
+        parts.append("Course materials (from uploads):\n" + "\n\n".join(materials))
+    if not parts:
+        parts.append("No recent discussion or uploaded materials.")
+    context = "\n\n---\n\n".join(parts)
+    unpacked = estimate_tokens("\n".join(chat_lines)) + sum(estimate_tokens(t) for t in chunk_texts)
+    logger.info(
+        "RAG context %s %d: ~%d -> ~%d tokens (budget %d); %d/%d chunks, %d/%d chat lines",
+        scope, scope_id, unpacked, estimate_tokens(context), RAG_CONTEXT_TOKEN_BUDGET,
+        len(materials), len(chunk_texts), len(chat_lines_kept), len(chat_lines),
+    )
+    return PROMPT_TEMPLATE.format(context=context, question=question)
 
 
 async def query_rag(
@@ -38,23 +545,49 @@ async def query_rag(
     """Embed question, retrieve top chunks, build prompt, generate answer.
     For course scope, pass recent_chat_snippet to include course chat in context.
     """
-    scope_type = "course" if scope == "course" else "group"
-    query_vec = encode_single(question)
-    query_vec_np = np.array([query_vec], dtype=np.float32)
+    query_vec = await encode_single_async(question)
+    key = _answer_key(db, scope, scope_id, query_vec, recent_chat_snippet)
+    if _answer_cache.enabled:
+        cached = _answer_cache.get(*key)
+        if cached is not None:
+            return cached
+    prompt = await build_rag_prompt(db, scope, scope_id, question, recent_chat_snippet, query_vec)
+    started = time.perf_counter()
+    answer = await generate(prompt)
+    logger.info(
+        "RAG answer %s %d: %.0f ms for a ~%d-token prompt",
+        scope, scope_id, (time.perf_counter() - started) * 1000, estimate_tokens(prompt),
+    )
+    if _answer_cache.enabled and answer:
+        _answer_cache.put(key.scope, key.scope_id, key.question_vec, answer, key.index_version, key.chat_hash)
+    return answer
 
-    chunk_ids = search_index(scope_type, scope_id, query_vec_np, top_k=RAG_TOP_K)
-    chunk_texts = get_chunk_texts_by_ids(db, chunk_ids)
 
+async def query_rag_stream(
+    db: Session,
+    scope: str,
+    scope_id: int,
+    question: str,
+    recent_chat_snippet: str | None = None,
+) -> AsyncIterator[str]:
+    """Like query_rag, but yields the answer text as the LLM generates it.
+    A cached answer is yielded in one piece; a fully streamed answer is cached.
+    """
+    query_vec = await encode_single_async(question)
+    key = _answer_key(db, scope, scope_id, query_vec, recent_chat_snippet)
+    if _answer_cache.enabled:
+        cached = _answer_cache.get(*key)
+        if cached is not None:
+            yield cached
+            return
+    prompt = await build_rag_prompt(db, scope, scope_id, question, recent_chat_snippet, query_vec)
     parts = []
-    if recent_chat_snippet and recent_chat_snippet.strip():
-        parts.append("Recent course discussion:\n" + recent_chat_snippet.strip())
-    if chunk_texts:
-        parts.append("Course materials (from uploads):\n" + "\n\n".join(chunk_texts))
-    if not parts:
-        parts.append("No recent discussion or uploaded materials.")
-    context = "\n\n---\n\n".join(parts)
-    prompt = PROMPT_TEMPLATE.format(context=context, question=question)
-    return await generate(prompt)
+    async for text in generate_stream(prompt):
+        parts.append(text)
+        yield text
+    answer = "".join(parts).strip()
+    if _answer_cache.enabled and answer:
+        _answer_cache.put(key.scope, key.scope_id, key.question_vec, answer, key.index_version, key.chat_hash)
 
 
 SUMMARY_PROMPT_TEMPLATE = """Summarize the following course discussion and materials for students. Be concise and highlight key points.
@@ -81,3 +614,35 @@ async def course_summary_rag(
         materials=materials,
     )
     return await generate(prompt)
+
+
+SUMMARY_UPDATE_PROMPT_TEMPLATE = """Here is the current summary of a course discussion and its materials:
+
+{previous_summary}
+
+Update it with the new messages below{materials_note}. Keep what is still relevant, add new key points, and stay concise.
+
+New messages:
+{new_messages}
+{materials}
+Provide the updated short summary (a few sentences)."""
+
+
+async def course_summary_update_rag(
+    previous_summary: str,
+    new_messages: str,
+    top_chunk_texts: List[str] | None,
+) -> str:
+    """Incrementally update a stored summary. Pass top_chunk_texts only when the materials changed."""
+    if top_chunk_texts:
+        materials_note = " and the updated materials"
+        materials = "\nUpdated materials:\n" + "\n\n".join(top_chunk_texts) + "\n"
+    else:
+        materials_note, materials = "", ""
+    prompt = SUMMARY_UPDATE_PROMPT_TEMPLATE.format(
+        previous_summary=previous_summary,
+        materials_note=materials_note,
+        new_messages=new_messages or "(none)",
+        materials=materials,
+    )
+    return await generate(prompt)
@@ -0,0 +1,53 @@
+"""Single-flight request coalescing: concurrent calls with the same key share one in-flight
+coroutine and its result (or exception). The shared work runs as its own task, so a
+caller that disconnects doesn't cancel it for the others.
+"""
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self.stats = {"calls": 0, "executed": 0, "coalesced": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await fn() unless an identical call is already in flight; then await that one."""
+        self.stats["calls"] += 1
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["executed"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "in_flight": len(self._inflight)}
+
+
+_groups: dict[str, SingleFlight] = {}
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Named coalescing group (e.g. one per endpoint); created on first use."""
+    group = _groups.get(name)
+    if group is None:
+        group = _groups[name] = SingleFlight()
+    return group
+
+
+def get_single_flight_stats() -> dict:
+    """Per-group calls, executions and coalesced calls."""
+    return {name: group.snapshot() for name, group in _groups.items()}
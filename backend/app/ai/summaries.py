@@ -0,0 +1,128 @@
+"""Stored, incrementally maintained course summaries.
+
+A summary is stored with the watermark it covers: the newest course message id and the
+course index version. Requests return the stored summary; when the watermark has moved,
+a refresh is scheduled in the background. A refresh with a previous summary only feeds
+the messages since the watermark (and the materials, if the index changed) to the LLM.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.ai.rag import course_summary_rag, course_summary_update_rag, retrieve_chunks_batch
+from app.ai.vector_store import get_index_version
+from app.database import SessionLocal
+from app.models import CourseMessage, CourseSummary
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MESSAGES = 50
+# Materials are retrieved for each facet in one batched search, so the summary isn't built
+# from the chunks nearest a single generic query
+SUMMARY_QUERIES = (
+    "summary overview key points",
+    "important definitions and concepts",
+    "assignments deadlines and exams",
+)
+SUMMARY_MATERIALS = 5
+
+# Courses with a refresh running in this process, and the tasks (kept so they aren't GC'd)
+_refreshing: set[int] = set()
+_tasks: set[asyncio.Task] = set()
+
+
+def _watermark(db: Session, course_id: int) -> tuple[int | None, str | None]:
+    last_message_id = (
+        db.query(func.max(CourseMessage.id)).filter(CourseMessage.course_id == course_id).scalar()
+    )
+    return last_message_id, get_index_version("course", course_id)
+
+
+def _messages_text(db: Session, course_id: int, after_id: int | None) -> str:
+    """Up to SUMMARY_MESSAGES newest messages (after after_id, if given), chronological."""
+    query = db.query(CourseMessage).filter(CourseMessage.course_id == course_id)
+    if after_id is not None:
+        query = query.filter(CourseMessage.id > after_id)
+    messages = list(reversed(query.order_by(CourseMessage.id.desc()).limit(SUMMARY_MESSAGES).all()))
+    return "\n".join(m.content for m in messages)
+
+
+async def _summary_materials(db: Session, course_id: int) -> list[str]:
+    """Up to SUMMARY_MATERIALS chunk texts, taken from the facet queries' results in turn."""
+    per_query = await retrieve_chunks_batch(db, "course", course_id, list(SUMMARY_QUERIES), top_k=SUMMARY_MATERIALS)
+    materials: dict[int, str] = {}
+    for rank in range(SUMMARY_MATERIALS):
+        for hits in per_query:
+            if rank < len(hits) and len(materials) < SUMMARY_MATERIALS:
+                materials.setdefault(hits[rank].chunk_id, hits[rank].text)
+    return list(materials.values())
+
+
+def get_course_summary(db: Session, course_id: int) -> tuple[CourseSummary, bool]:
+    """Stored summary row and whether it is stale. Schedules a background refresh when stale."""
+    row = db.get(CourseSummary, course_id)
+    if row is None:
+        row = CourseSummary(course_id=course_id, status="pending")
+        db.add(row)
+        db.commit()
+    last_message_id, index_version = _watermark(db, course_id)
+    stale = (
+        row.summary is None
+        or row.last_message_id != last_message_id
+        or row.index_version != index_version
+    )
+    if stale and course_id not in _refreshing:
+        _refreshing.add(course_id)
+        row.status = "generating"
+        db.commit()
+        task = asyncio.get_running_loop().create_task(_refresh(course_id), name=f"course-summary-{course_id}")
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+    return row, stale
+
+
+async def _refresh(course_id: int) -> None:
+    db = SessionLocal()
+    try:
+        row = db.get(CourseSummary, course_id)
+        # Watermark read first: anything arriving during generation triggers the next refresh
+        last_message_id, index_version = _watermark(db, course_id)
+        if row.summary:
+            new_messages = _messages_text(db, course_id, row.last_message_id)
+            materials = None
+            if index_version != row.index_version:
+                materials = await _summary_materials(db, course_id)
+            summary = await course_summary_update_rag(row.summary, new_messages, materials)
+        else:
+            chat_snippet = _messages_text(db, course_id, None) or "No discussion yet."
+            materials = await _summary_materials(db, course_id)
+            summary = await course_summary_rag(db, course_id, chat_snippet, materials)
+        row.summary = summary
+        row.last_message_id = last_message_id
+        row.index_version = index_version
+        row.status = "ready"
+        row.error = None
+        row.generated_at = datetime.now(timezone.utc)
+        db.commit()
+        logger.info("Course %d summary refreshed (messages up to %s)", course_id, last_message_id)
+    except Exception as e:
+        logger.exception("Course %d summary refresh failed", course_id)
+        db.rollback()
+        row = db.get(CourseSummary, course_id)
+        if row is not None:
+            row.status = "failed"
+            row.error = str(e) or "AI service temporarily unavailable."
+            db.commit()
+    finally:
+        _refreshing.discard(course_id)
+        db.close()
+
+
+async def stop_summary_refreshes() -> None:
+    """Cancel in-flight refreshes (lifespan shutdown); they are rescheduled on the next request."""
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
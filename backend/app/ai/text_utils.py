@@ -1,24 +1,182 @@
-"""Text extraction from PDF/DOCX/TXT and chunking for RAG."""
+"""Text extraction from PDF/DOCX/TXT and chunking for RAG.
+
+PDF pages are parsed in a process pool: pypdf is CPU-bound and holds the GIL,
+so page ranges of one large PDF are extracted in parallel, off the calling
+process, under a per-file timeout and a per-process memory cap. Only a bounded
+window of ranges is in flight, so a slow consumer doesn't buffer the whole file.
+"""
+import multiprocessing
+import queue
 import re
+import time
+from collections import deque
 from pathlib import Path
-from typing import List
+from typing import Iterable, Iterator, List
+
+from app.config import (
+    EXTRACTION_MEMORY_LIMIT_MB,
+    EXTRACTION_PAGES_PER_TASK,
+    EXTRACTION_PROCESSES,
+    EXTRACTION_TIMEOUT_SECONDS,
+)
 
 # Approx 4 chars per token; target 500-800 tokens per chunk
 CHUNK_TARGET_CHARS = 2400
 CHUNK_OVERLAP_CHARS = 200
 
 
+class ExtractionError(Exception):
+    """Raised when a file times out or exceeds the memory cap during extraction."""
+    pass
+
+
+def _limit_worker_memory(limit_mb: int) -> None:
+    """Pool initializer: cap the worker's address space so a pathological PDF raises MemoryError."""
+    try:
+        import resource
+    except ImportError:  # Windows: no RLIMIT_AS, rely on the timeout alone
+        return
+    limit = limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _count_pdf_pages(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def _extract_pdf_pages(args: tuple[str, int, int]) -> list[str]:
+    """Worker task: text of pages [start, end) of one PDF."""
+    from pypdf import PdfReader
+    path, start, end = args
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+# Idle worker pools. Each PDF checks one out, so a timeout only terminates the
+# processes working on that file, never another upload's.
+_idle_pools: "queue.LifoQueue" = queue.LifoQueue()
+
+
+def _checkout_pool():
+    try:
+        return _idle_pools.get_nowait()
+    except queue.Empty:
+        # spawn: forking a process that runs threads (uvicorn, ingestion workers) can deadlock
+        ctx = multiprocessing.get_context("spawn")
+        return ctx.Pool(
+            processes=EXTRACTION_PROCESSES,
+            initializer=_limit_worker_memory,
+            initargs=(EXTRACTION_MEMORY_LIMIT_MB,),
+        )
+
+
+def _release_pool(pool, healthy: bool) -> None:
+    if healthy:
+        _idle_pools.put(pool)
+    else:
+        pool.terminate()
+
+
+def shutdown_extraction_pools() -> None:
+    """Terminate idle extraction pools (call on app shutdown)."""
+    while True:
+        try:
+            _idle_pools.get_nowait().terminate()
+        except queue.Empty:
+            return
+
+
+def iter_pdf_pages(
+    file_path: Path,
+    timeout: float = EXTRACTION_TIMEOUT_SECONDS,
+    pages_per_task: int = EXTRACTION_PAGES_PER_TASK,
+) -> Iterator[str]:
+    """Yield page texts of a PDF in order, as soon as each page range finishes.
+    Ranges are parsed in parallel in worker processes, at most two per worker ahead of the
+    consumer. Raises ExtractionError if the time spent waiting on the workers exceeds timeout
+    (time the consumer spends between pages doesn't count) or a worker hits the memory cap.
+    """
+    remaining = timeout
+    pool = _checkout_pool()
+    healthy = False
+
+    def wait(result):
+        nonlocal remaining
+        started = time.monotonic()
+        try:
+            return result.get(max(remaining, 0))
+        except multiprocessing.TimeoutError as e:
+            raise ExtractionError("PDF extraction timed out") from e
+        finally:
+            remaining -= time.monotonic() - started
+
+    try:
+        n_pages = wait(pool.apply_async(_count_pdf_pages, (str(file_path),)))
+        tasks = deque(
+            (str(file_path), start, min(start + pages_per_task, n_pages))
+            for start in range(0, n_pages, pages_per_task)
+        )
+        pending = deque()
+        while tasks or pending:
+            while tasks and len(pending) < 2 * EXTRACTION_PROCESSES:
+                pending.append(pool.apply_async(_extract_pdf_pages, (tasks.popleft(),)))
+            yield from wait(pending.popleft())
+        healthy = True
+    except MemoryError as e:
+        raise ExtractionError("PDF exceeds the extraction memory limit") from e
+    finally:
+        # Abandoned early (timeout, error, or consumer stopped): kill in-flight work
+        _release_pool(pool, healthy)
+
+
+def _joined(pieces: Iterable[str], sep: str) -> Iterator[str]:
+    """Yield pieces with sep between them, like a lazy sep.join(pieces)."""
+    first = True
+    for piece in pieces:
+        if not first:
+            yield sep
+        first = False
+        yield piece
+
+
+def iter_text_from_file(file_path: Path, block_chars: int = 65536) -> Iterator[str]:
+    """Stream plain text from PDF (per page), DOCX (per paragraph) or TXT (fixed-size blocks).
+    Concatenated, the pieces equal extract_text_from_file(file_path).
+    Raises ExtractionError if the file can't be parsed, times out or exceeds the memory cap.
+    """
+    path = Path(file_path)
+    suffix = path.suffix.lower()
+    if suffix == ".txt":
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            while block := f.read(block_chars):
+                yield block
+        return
+    try:
+        if suffix == ".pdf":
+            yield from _joined(iter_pdf_pages(path), "\n")
+        elif suffix == ".docx":
+            from docx import Document
+            yield from _joined((p.text for p in Document(path).paragraphs), "\n")
+    except ExtractionError:
+        raise
+    except Exception as e:
+        raise ExtractionError("Could not extract text from file") from e
+
+
 def extract_text_from_file(file_path: Path) -> str:
-    """Extract plain text from PDF, DOCX, or TXT."""
+    """Extract plain text from PDF, DOCX, or TXT.
+    Raises ExtractionError if a PDF times out or exceeds the memory cap.
+    """
     path = Path(file_path)
     suffix = path.suffix.lower()
     if suffix == ".txt":
         return path.read_text(encoding="utf-8", errors="replace")
     if suffix == ".pdf":
         try:
-            from pypdf import PdfReader
-            reader = PdfReader(path)
-            return "\n".join(page.extract_text() or "" for page in reader.pages)
+            return "\n".join(iter_pdf_pages(path))
+        except ExtractionError:
+            raise
         except Exception:
             return ""
     if suffix == ".docx":
@@ -31,34 +189,56 @@ def extract_text_from_file(file_path: Path) -> str:
     return ""
 
 
-def chunk_text(text: str, target_chars: int = CHUNK_TARGET_CHARS, overlap: int = CHUNK_OVERLAP_CHARS) -> List[str]:
-    """Split text into chunks of ~target_chars with optional overlap. Tries to break on paragraphs/sentences."""
-    text = text.strip()
-    if not text:
-        return []
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + target_chars
-        if end >= len(text):
-            chunk = text[start:].strip()
+def _cut_chunk(text: str, target_chars: int, overlap: int) -> tuple[str, int]:
+    """Cut one non-final chunk from the start of text (len(text) > target_chars).
+    Prefers a paragraph/sentence/word break past the halfway point. Returns (chunk, next_start).
+    """
+    segment = text[:target_chars]
+    for sep in ["\n\n", "\n", ". ", " "]:
+        idx = segment.rfind(sep)
+        if idx > target_chars // 2:
+            break_at = idx + len(sep)
+            return text[:break_at].strip(), break_at - overlap
+    return segment.strip(), target_chars - overlap
+
+
+_NON_SPACE = re.compile(r"\S")
+
+
+def iter_chunks(
+    pieces: Iterable[str],
+    target_chars: int = CHUNK_TARGET_CHARS,
+    overlap: int = CHUNK_OVERLAP_CHARS,
+) -> Iterator[str]:
+    """Streaming chunk_text: consume text pieces (pages, paragraphs, blocks) and yield the
+    same chunks chunk_text would yield for their concatenation. Only about one chunk of
+    text is buffered, so memory is bounded by chunk size rather than document size.
+    """
+    buf = ""
+    for piece in pieces:
+        if not buf:
+            # Equivalent of the leading strip() in chunk_text
+            piece = piece.lstrip()
+        buf += piece
+        # Cut only when non-whitespace lies past target_chars: then this can't be the final chunk
+        while len(buf) > target_chars and _NON_SPACE.search(buf, target_chars):
+            chunk, start = _cut_chunk(buf, target_chars, overlap)
             if chunk:
-                chunks.append(chunk)
-            break
-        # Prefer break at paragraph or sentence
-        segment = text[start:end]
-        break_at = -1
-        for sep in ["\n\n", "\n", ". ", " "]:
-            idx = segment.rfind(sep)
-            if idx > target_chars // 2:
-                break_at = idx + len(sep)
-                break
-        if break_at > 0:
-            chunk = text[start : start + break_at].strip()
-            start = start + break_at - overlap
-        else:
-            chunk = segment.strip()
-            start = end - overlap
+                yield chunk
+            buf = buf[start:]
+    buf = buf.rstrip()
+    while buf:
+        if len(buf) <= target_chars:
+            chunk = buf.strip()
+            if chunk:
+                yield chunk
+            return
+        chunk, start = _cut_chunk(buf, target_chars, overlap)
         if chunk:
-            chunks.append(chunk)
-    return chunks
+            yield chunk
+        buf = buf[start:]
+
+
+def chunk_text(text: str, target_chars: int = CHUNK_TARGET_CHARS, overlap: int = CHUNK_OVERLAP_CHARS) -> List[str]:
+    """Split text into chunks of ~target_chars with optional overlap. Tries to break on paragraphs/sentences."""
+    return list(iter_chunks([text], target_chars, overlap))
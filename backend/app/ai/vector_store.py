@@ -1,11 +1,55 @@
-"""FAISS vector store per course/group. Indexes stored under backend/vector_indexes/."""
+"""FAISS vector store per course/group. Indexes stored under backend/vector_indexes/.
+
+Each scope index is an ID-mapped FAISS index: DocumentChunk ids are stored in
+the index itself (add_with_ids), so searches return chunk ids directly and
+vectors can be removed by id. Loaded indexes stay resident in an LRU cache
+keyed by (scope, scope_id) so searches don't hit disk on every Ask-AI request;
+each search stats the file and reloads an index rewritten by another process.
+
+Index tiers: a scope starts on an exact flat index and is rebuilt in the
+background as IVF-Flat or HNSW once it passes VECTOR_INDEX_ANN_THRESHOLD chunks.
+
+Compression (opt-in, VECTOR_INDEX_COMPRESSION=sq8|pq): the resident index holds
+int8 / PQ codes; full-precision vectors live in a memory-mapped .vecs store and
+the top candidates are rescored exactly against them.
+
+Federated search (federated_search) queries several scope indexes in parallel, e.g. a group
+and its parent course, and merges the hits by L2 distance (all scopes share one embedding
+model) within a latency budget. search_index_batch searches many queries in one FAISS call
+and returns their distances for relevance cutoffs.
+
+Maintenance (scripts/maintain_vector_indexes.py): get_index_chunk_ids for consistency checks
+against the DB, compact_index to drop vectors of deleted chunks, rebuild_index to replace an
+index wholesale; all swap files atomically under the scope lock.
+"""
+import logging
+import math
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import List, Literal
+from typing import List, Literal, NamedTuple
 
 import numpy as np
 
-from app.config import VECTOR_INDEX_DIR
+from app.ai.file_locks import locked
+from app.config import (
+    VECTOR_INDEX_ANN_THRESHOLD,
+    VECTOR_INDEX_ANN_TYPE,
+    VECTOR_INDEX_CACHE_BYTES,
+    VECTOR_INDEX_COMPRESSION,
+    VECTOR_INDEX_DIR,
+    VECTOR_INDEX_HNSW_EF_SEARCH,
+    VECTOR_INDEX_HNSW_M,
+    VECTOR_INDEX_IVF_NPROBE,
+    VECTOR_INDEX_PQ_M,
+    VECTOR_INDEX_RERANK_FACTOR,
+    VECTOR_SEARCH_BUDGET_MS,
+)
+
+logger = logging.getLogger(__name__)
 
 # Lazy import to avoid loading faiss before first use
 _faiss = None
@@ -23,51 +67,796 @@ def _index_path(scope: Literal["course", "group"], scope_id: int) -> Path:
     return VECTOR_INDEX_DIR / f"{scope}_{scope_id}.index"
 
 
-def _index_meta_path(scope: Literal["course", "group"], scope_id: int) -> Path:
+def _legacy_ids_path(scope: Literal["course", "group"], scope_id: int) -> Path:
+    """Old binary sidecar (int64 chunk_id per row). Folded into the index on first touch."""
+    return VECTOR_INDEX_DIR / f"{scope}_{scope_id}.ids"
+
+
+def _legacy_meta_path(scope: Literal["course", "group"], scope_id: int) -> Path:
+    """Old text sidecar (one chunk_id per line). Folded into the index on first touch."""
     return VECTOR_INDEX_DIR / f"{scope}_{scope_id}.meta.txt"
 
 
-def get_or_create_index(scope: Literal["course", "group"], scope_id: int, dimension: int):
-    """Load existing FAISS index or create new one. dimension = embedding size (384 for MiniLM-L6)."""
+def _read_legacy_chunk_ids(scope: Literal["course", "group"], scope_id: int) -> np.ndarray:
+    ids_path = _legacy_ids_path(scope, scope_id)
+    if ids_path.exists():
+        return np.fromfile(ids_path, dtype="<i8")
+    meta_path = _legacy_meta_path(scope, scope_id)
+    if meta_path.exists():
+        with open(meta_path, "r") as f:
+            return np.array([int(line.strip()) for line in f if line.strip()], dtype=np.int64)
+    return np.empty(0, dtype=np.int64)
+
+
+def _new_index(dimension: int):
     faiss = _get_faiss()
-    path = _index_path(scope, scope_id)
-    if path.exists():
-        index = faiss.read_index(str(path))
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+
+
+def _is_legacy(index) -> bool:
+    """Positional IndexFlatL2 whose chunk ids live in a sidecar file."""
+    return isinstance(index, _get_faiss().IndexFlat)
+
+
+def _index_tier(index) -> str:
+    """'flat', 'ivf' or 'hnsw'."""
+    faiss = _get_faiss()
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(faiss.downcast_index(index.index), faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def _code_storage(index):
+    """The part of the index that holds per-vector codes (has code_size)."""
+    faiss = _get_faiss()
+    if isinstance(index, faiss.IndexIVF):
         return index
-    index = faiss.IndexFlatL2(dimension)
+    inner = faiss.downcast_index(index.index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.downcast_index(inner.storage)
+    return inner
+
+
+def _index_compression(index) -> str:
+    """'none', 'sq8' or 'pq'."""
+    faiss = _get_faiss()
+    storage = _code_storage(index)
+    if isinstance(storage, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "sq8"
+    if isinstance(storage, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    return "none"
+
+
+def _configure_search(index) -> None:
+    """Apply the configured nprobe / efSearch knobs to a freshly loaded or built index."""
+    tier = _index_tier(index)
+    if tier == "ivf":
+        index.nprobe = VECTOR_INDEX_IVF_NPROBE
+    elif tier == "hnsw":
+        _get_faiss().downcast_index(index.index).hnsw.efSearch = VECTOR_INDEX_HNSW_EF_SEARCH
+
+
+def _index_ids(index) -> np.ndarray:
+    """All chunk ids stored in an index."""
+    faiss = _get_faiss()
+    if _index_tier(index) != "ivf":
+        return faiss.vector_to_array(index.id_map).astype(np.int64)
+    invlists = index.invlists
+    parts = [
+        faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+        for l in range(index.nlist)
+        if invlists.list_size(l)
+    ]
+    return np.concatenate(parts).astype(np.int64) if parts else np.empty(0, dtype=np.int64)
+
+
+def _extract_vectors(index, scope: str | None = None, scope_id: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """Return (vectors, chunk_ids) for everything stored in an index.
+    Compressed indexes only hold approximate codes, so vectors come from the scope's
+    exact-vector store when one is given and covers every id.
+    """
+    ids = _index_ids(index)
+    if not len(ids):
+        return np.empty((0, index.d), dtype=np.float32), ids
+    if scope is not None and _index_compression(index) != "none":
+        exact = _load_exact_vectors(scope, scope_id, index.d)
+        if exact is not None:
+            vectors, found = exact.lookup(ids)
+            if found.all():
+                return vectors, ids
+    if _index_tier(index) == "ivf":
+        return index.reconstruct_batch(ids), ids
+    return index.index.reconstruct_n(0, index.ntotal), ids
+
+
+def _build_index(vectors: np.ndarray, chunk_ids: np.ndarray, tier: str, compression: str | None = None):
+    """Build a flat, IVF or HNSW index over vectors, keyed by chunk_ids.
+    compression defaults to VECTOR_INDEX_COMPRESSION; PQ falls back to SQ8 when there are
+    too few vectors to train 256 centroids or the dimension doesn't split into PQ_M parts.
+    """
+    faiss = _get_faiss()
+    compression = compression or VECTOR_INDEX_COMPRESSION
+    n, dimension = vectors.shape
+    if compression == "pq" and (n < 256 or dimension % VECTOR_INDEX_PQ_M):
+        compression = "sq8"
+    sq8 = faiss.ScalarQuantizer.QT_8bit
+    if tier == "hnsw":
+        if compression == "sq8":
+            inner = faiss.IndexHNSWSQ(dimension, sq8, VECTOR_INDEX_HNSW_M)
+        elif compression == "pq":
+            inner = faiss.IndexHNSWPQ(dimension, VECTOR_INDEX_PQ_M, VECTOR_INDEX_HNSW_M)
+        else:
+            inner = faiss.IndexHNSWFlat(dimension, VECTOR_INDEX_HNSW_M)
+        inner.train(vectors)
+        index = faiss.IndexIDMap2(inner)
+    elif tier == "ivf":
+        # ~4*sqrt(n) lists, each trained with at least 39 points as FAISS recommends
+        nlist = max(1, min(int(4 * math.sqrt(n)), n // 39, 65536))
+        quantizer = faiss.IndexFlatL2(dimension)
+        if compression == "sq8":
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, sq8)
+        elif compression == "pq":
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, VECTOR_INDEX_PQ_M, 8)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        index.train(vectors)
+        # Hashtable direct map keeps reconstruct() and remove_ids() working by chunk id
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    else:
+        if compression == "sq8":
+            inner = faiss.IndexScalarQuantizer(dimension, sq8)
+        elif compression == "pq":
+            inner = faiss.IndexPQ(dimension, VECTOR_INDEX_PQ_M, 8)
+        else:
+            inner = faiss.IndexFlatL2(dimension)
+        inner.train(vectors)
+        index = faiss.IndexIDMap2(inner)
+    index.add_with_ids(vectors, chunk_ids)
+    _configure_search(index)
+    return index
+
+
+def _remove_ids(index, chunk_ids: np.ndarray, scope: str, scope_id: int):
+    """Remove ids from index. Returns (index, removed); HNSW can't delete in place so it is rebuilt."""
+    if _index_tier(index) != "hnsw":
+        return index, int(index.remove_ids(chunk_ids))
+    vectors, ids = _extract_vectors(index, scope, scope_id)
+    keep = ~np.isin(ids, chunk_ids)
+    removed = int(len(ids) - keep.sum())
+    if not removed:
+        return index, 0
+    if not keep.any():
+        return _new_index(index.d), removed
+    return _build_index(vectors[keep], ids[keep], "hnsw", _index_compression(index)), removed
+
+
+def _exact_vectors_path(scope: str, scope_id: int) -> Path:
+    """Full-precision float32 rows backing a compressed index, append-only."""
+    return VECTOR_INDEX_DIR / f"{scope}_{scope_id}.vecs"
+
+
+def _exact_ids_path(scope: str, scope_id: int) -> Path:
+    """int64 chunk_id for each row of the .vecs file, append-only."""
+    return VECTOR_INDEX_DIR / f"{scope}_{scope_id}.vecids"
+
+
+class _ExactVectors:
+    """Memory-mapped full-precision vectors for exact rescoring of compressed search results."""
+
+    def __init__(self, vectors: np.ndarray, chunk_ids: np.ndarray):
+        self.vectors = vectors
+        self._order = np.argsort(chunk_ids, kind="stable")
+        self._sorted_ids = np.asarray(chunk_ids)[self._order]
+
+    def lookup(self, chunk_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Return (vectors, found_mask); rows for missing ids are zero."""
+        pos = np.searchsorted(self._sorted_ids, chunk_ids)
+        pos = np.minimum(pos, max(len(self._sorted_ids) - 1, 0))
+        found = self._sorted_ids[pos] == chunk_ids if len(self._sorted_ids) else np.zeros(len(chunk_ids), dtype=bool)
+        out = np.zeros((len(chunk_ids), self.vectors.shape[1]), dtype=np.float32)
+        out[found] = self.vectors[self._order[pos[found]]]
+        return out, found
+
+
+def _load_exact_vectors(scope: str, scope_id: int, dimension: int) -> _ExactVectors | None:
+    vecs_path = _exact_vectors_path(scope, scope_id)
+    ids_path = _exact_ids_path(scope, scope_id)
+    if not vecs_path.exists() or not ids_path.exists():
+        return None
+    # A crash between the two appends leaves one file longer; only rows present in both count
+    n = min(vecs_path.stat().st_size // (4 * dimension), ids_path.stat().st_size // 8)
+    if n == 0:
+        return None
+    vectors = np.memmap(vecs_path, dtype="<f4", mode="r", shape=(n, dimension))
+    chunk_ids = np.fromfile(ids_path, dtype="<i8", count=n)
+    return _ExactVectors(vectors, chunk_ids)
+
+
+def _append_exact_vectors(scope: str, scope_id: int, vectors: np.ndarray, chunk_ids: np.ndarray) -> None:
+    with open(_exact_vectors_path(scope, scope_id), "ab") as f:
+        np.ascontiguousarray(vectors, dtype="<f4").tofile(f)
+    with open(_exact_ids_path(scope, scope_id), "ab") as f:
+        np.asarray(chunk_ids, dtype="<i8").tofile(f)
+
+
+def _write_exact_vectors(scope: str, scope_id: int, vectors: np.ndarray, chunk_ids: np.ndarray) -> None:
+    """Replace the exact-vector store (temp file + rename)."""
+    for path, data in (
+        (_exact_vectors_path(scope, scope_id), np.ascontiguousarray(vectors, dtype="<f4")),
+        (_exact_ids_path(scope, scope_id), np.asarray(chunk_ids, dtype="<i8")),
+    ):
+        tmp_path = path.with_name(path.name + ".tmp")
+        data.tofile(tmp_path)
+        os.replace(tmp_path, path)
+
+
+def _delete_exact_vectors(scope: str, scope_id: int) -> None:
+    _exact_vectors_path(scope, scope_id).unlink(missing_ok=True)
+    _exact_ids_path(scope, scope_id).unlink(missing_ok=True)
+
+
+def _write_index(index, path: Path) -> None:
+    """Write to a temp file then rename, so readers never see a half-written index."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    _get_faiss().write_index(index, str(tmp_path))
+    os.replace(tmp_path, path)
+
+
+# Guards _upgrades_in_progress: scopes with a background flat -> ANN rebuild running
+_scope_locks_guard = threading.Lock()
+_upgrades_in_progress: set[tuple[str, int]] = set()
+
+
+def _scope_lock(scope: str, scope_id: int):
+    """Serializes writers of a scope's index files, across threads and processes."""
+    return locked(VECTOR_INDEX_DIR / f"{scope}_{scope_id}.lock")
+
+
+def _migrate_legacy_index(scope: Literal["course", "group"], scope_id: int, index):
+    """Wrap a positional IndexFlatL2 + sidecar pair into an ID-mapped index and persist it."""
+    chunk_ids = _read_legacy_chunk_ids(scope, scope_id)
+    # Rows past the end of the sidecar have no chunk id and were never searchable
+    n = min(int(index.ntotal), len(chunk_ids))
+    migrated = _new_index(index.d)
+    if n:
+        migrated.add_with_ids(index.reconstruct_n(0, n), chunk_ids[:n].astype(np.int64))
+    _write_index(migrated, _index_path(scope, scope_id))
+    _legacy_ids_path(scope, scope_id).unlink(missing_ok=True)
+    _legacy_meta_path(scope, scope_id).unlink(missing_ok=True)
+    return migrated
+
+
+def _read_index(scope: Literal["course", "group"], scope_id: int):
+    """Read a scope index from disk, migrating the legacy layout if needed. None if absent."""
+    path = _index_path(scope, scope_id)
+    if not path.exists():
+        return None
+    index = _get_faiss().read_index(str(path))
+    if _is_legacy(index):
+        index = _migrate_legacy_index(scope, scope_id, index)
+    _configure_search(index)
     return index
 
 
+def migrate_legacy_indexes() -> int:
+    """One-time migration of every positional index under VECTOR_INDEX_DIR. Returns number converted."""
+    if not VECTOR_INDEX_DIR.exists():
+        return 0
+    migrated = 0
+    for path in VECTOR_INDEX_DIR.glob("*_*.index"):
+        scope, _, scope_id = path.stem.partition("_")
+        if scope not in ("course", "group") or not scope_id.isdigit():
+            continue
+        index = _get_faiss().read_index(str(path))
+        if _is_legacy(index):
+            _migrate_legacy_index(scope, int(scope_id), index)
+            invalidate_index_cache(scope, int(scope_id))
+            migrated += 1
+    return migrated
+
+
+class _CachedIndex(NamedTuple):
+    """Resident index, exact vectors for rescoring (compressed indexes only), estimated footprint
+    and the on-disk version it was read from.
+    """
+
+    index: object
+    exact: _ExactVectors | None
+    nbytes: int
+    version: str  # get_index_version() of the file it was read from
+
+
+# (scope, scope_id) -> _CachedIndex, least recently used first
+_index_cache: "OrderedDict[tuple[str, int], _CachedIndex]" = OrderedDict()
+_index_cache_bytes = 0
+_index_cache_lock = threading.Lock()
+_index_cache_stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "invalidations": 0}
+
+
+def _estimate_nbytes(index) -> int:
+    # Per-vector code (float32 row, SQ8 byte per dim or PQ code) plus the int64 id;
+    # exact vectors of compressed indexes are memory-mapped and not counted
+    nbytes = int(index.ntotal) * (int(_code_storage(index).code_size) + 8)
+    tier = _index_tier(index)
+    if tier == "ivf":
+        nbytes += int(index.nlist) * int(index.d) * 4
+    elif tier == "hnsw":
+        # Level-0 neighbour lists dominate: 2*M int32 links per vector
+        nbytes += int(index.ntotal) * 2 * VECTOR_INDEX_HNSW_M * 4
+    return nbytes
+
+
+def _cache_put(key: tuple[str, int], entry: _CachedIndex) -> None:
+    """Insert entry and evict least recently used ones until under budget. Caller holds the lock."""
+    global _index_cache_bytes
+    old = _index_cache.pop(key, None)
+    if old is not None:
+        _index_cache_bytes -= old.nbytes
+    if entry.nbytes > VECTOR_INDEX_CACHE_BYTES:
+        # Larger than the whole budget: serve it uncached
+        return
+    _index_cache[key] = entry
+    _index_cache_bytes += entry.nbytes
+    while _index_cache_bytes > VECTOR_INDEX_CACHE_BYTES and _index_cache:
+        _, evicted = _index_cache.popitem(last=False)
+        _index_cache_bytes -= evicted.nbytes
+        _index_cache_stats["evictions"] += 1
+
+
+def _load_cached(scope: Literal["course", "group"], scope_id: int) -> _CachedIndex | None:
+    """Return the resident index for a scope, loading it from disk on a miss.
+    A resident index whose file was rewritten since it was read (by any process) is reloaded.
+    """
+    key = (scope, scope_id)
+    # Stat before reading: a write landing mid-read leaves the entry stale, so it is reloaded next time
+    version = get_index_version(scope, scope_id)
+    with _index_cache_lock:
+        entry = _index_cache.get(key)
+        if entry is not None and entry.version == version:
+            _index_cache.move_to_end(key)
+            _index_cache_stats["hits"] += 1
+            return entry
+        _index_cache_stats["stale" if entry is not None else "misses"] += 1
+    if version is None:
+        invalidate_index_cache(scope, scope_id)
+        return None
+    index = _read_index(scope, scope_id)
+    if index is None:
+        return None
+    exact = None
+    if _index_compression(index) != "none":
+        exact = _load_exact_vectors(scope, scope_id, index.d)
+    entry = _CachedIndex(index, exact, _estimate_nbytes(index), version)
+    with _index_cache_lock:
+        # Don't let a read that raced with a newer write (or a concurrent, newer load) replace it
+        if get_index_version(scope, scope_id) == version:
+            _cache_put(key, entry)
+    return entry
+
+
+def invalidate_index_cache(scope: Literal["course", "group"], scope_id: int) -> None:
+    """Drop a scope's resident index so the next search reloads it from disk."""
+    global _index_cache_bytes
+    with _index_cache_lock:
+        entry = _index_cache.pop((scope, scope_id), None)
+        if entry is not None:
+            _index_cache_bytes -= entry.nbytes
+            _index_cache_stats["invalidations"] += 1
+
+
+def get_index_cache_stats() -> dict:
+    """Hit/miss/eviction counters and current memory use of the index cache."""
+    with _index_cache_lock:
+        return {
+            **_index_cache_stats,
+            "entries": len(_index_cache),
+            "bytes": _index_cache_bytes,
+            "budget_bytes": VECTOR_INDEX_CACHE_BYTES,
+        }
+
+
+def get_index_version(scope: Literal["course", "group"], scope_id: int) -> str | None:
+    """Opaque token that changes whenever the scope's index file is rewritten (any process).
+    None if the scope has no index yet.
+    """
+    try:
+        st = _index_path(scope, scope_id).stat()
+    except FileNotFoundError:
+        return None
+    # Writes replace the file (new inode), so the inode tells apart rewrites within one mtime tick
+    return f"{st.st_ino}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def list_index_scopes(scope: Literal["course", "group"] | None = None) -> List[tuple[str, int]]:
+    """(scope, scope_id) of every index file, sorted; only those of one scope type if given."""
+    found = []
+    for path in VECTOR_INDEX_DIR.glob("*_*.index"):
+        s, _, scope_id = path.stem.partition("_")
+        if s in ("course", "group") and scope_id.isdigit() and scope in (None, s):
+            found.append((s, int(scope_id)))
+    return sorted(found)
+
+
+def preload_indexes(limit: int) -> int:
+    """Load the `limit` most recently written indexes into the cache (startup warm-up).
+    Loaded oldest first so the newest end up most recently used. Returns number loaded.
+    """
+    if limit <= 0:
+        return 0
+    candidates = []
+    for scope, scope_id in list_index_scopes():
+        try:
+            candidates.append((_index_path(scope, scope_id).stat().st_mtime, scope, scope_id))
+        except FileNotFoundError:
+            continue
+    loaded = 0
+    for _, scope, scope_id in sorted(candidates, reverse=True)[:limit][::-1]:
+        if _load_cached(scope, scope_id) is not None:
+            loaded += 1
+    return loaded
+
+
+def get_or_create_index(scope: Literal["course", "group"], scope_id: int, dimension: int):
+    """Load existing FAISS index or create new one. dimension = embedding size (384 for MiniLM-L6)."""
+    index = _read_index(scope, scope_id)
+    if index is not None:
+        return index
+    return _new_index(dimension)
+
+
 def add_vectors_to_index(
     scope: Literal["course", "group"],
     scope_id: int,
     vectors: np.ndarray,
     chunk_ids: List[int],
 ) -> None:
-    """Append vectors to the scope index and persist. chunk_ids stored in meta file for retrieval."""
+    """Add vectors to the scope index under their DocumentChunk ids and persist.
+    New scopes are created in the configured compression mode. Schedules a background
+    ANN rebuild once a flat index passes VECTOR_INDEX_ANN_THRESHOLD.
+    """
     if vectors is None or len(vectors) == 0:
         return
-    faiss = _get_faiss()
     vectors = np.array(vectors, dtype=np.float32)
     if vectors.ndim == 1:
         vectors = vectors.reshape(1, -1)
-    dimension = vectors.shape[1]
+    ids = np.asarray(chunk_ids, dtype=np.int64)
 
-    index = get_or_create_index(scope, scope_id, dimension)
-    start = index.ntotal
-    index.add(vectors)
+    with _scope_lock(scope, scope_id):
+        index = _read_index(scope, scope_id)
+        if index is None:
+            index = _build_index(vectors, ids, "flat")
+        else:
+            index.add_with_ids(vectors, ids)
+        if _index_compression(index) != "none":
+            # Exact rows first, so the index never references ids missing from the store
+            _append_exact_vectors(scope, scope_id, vectors, ids)
+        _write_index(index, _index_path(scope, scope_id))
+        invalidate_index_cache(scope, scope_id)
+    if _index_tier(index) == "flat" and index.ntotal >= VECTOR_INDEX_ANN_THRESHOLD:
+        _schedule_ann_upgrade(scope, scope_id)
+
+
+def remove_vectors_from_index(
+    scope: Literal["course", "group"],
+    scope_id: int,
+    chunk_ids: List[int],
+) -> int:
+    """Remove vectors for the given DocumentChunk ids and persist. Returns number removed."""
+    if not chunk_ids:
+        return 0
+    with _scope_lock(scope, scope_id):
+        index = _read_index(scope, scope_id)
+        if index is None:
+            return 0
+        index, removed = _remove_ids(index, np.asarray(chunk_ids, dtype=np.int64), scope, scope_id)
+        if removed:
+            _write_index(index, _index_path(scope, scope_id))
+            invalidate_index_cache(scope, scope_id)
+    return removed
+
+
+def get_vectors(
+    scope: Literal["course", "group"],
+    scope_id: int,
+    chunk_ids: List[int],
+) -> tuple[np.ndarray, np.ndarray]:
+    """Stored vectors for chunk_ids in a scope index. Returns (vectors, found_mask);
+    rows for ids not in the index are zero. Compressed indexes answer from the exact store.
+    """
+    ids = np.asarray(chunk_ids, dtype=np.int64)
+    found = np.zeros(len(ids), dtype=bool)
+    entry = _load_cached(scope, scope_id)
+    if entry is None:
+        return np.zeros((len(ids), 0), dtype=np.float32), found
+    index = entry.index
+    vectors = np.zeros((len(ids), index.d), dtype=np.float32)
+    for row, chunk_id in enumerate(ids.tolist()):
+        try:
+            vectors[row] = index.reconstruct(chunk_id)
+        except RuntimeError:  # id not in the index
+            continue
+        found[row] = True
+    if entry.exact is not None and found.any():
+        exact, in_store = entry.exact.lookup(ids[found])
+        rows = np.flatnonzero(found)[in_store]
+        vectors[rows] = exact[in_store]
+    return vectors, found
+
+
+def _schedule_ann_upgrade(scope: Literal["course", "group"], scope_id: int) -> None:
+    key = (scope, scope_id)
+    with _scope_locks_guard:
+        if key in _upgrades_in_progress:
+            return
+        _upgrades_in_progress.add(key)
+    threading.Thread(
+        target=_upgrade_to_ann,
+        args=(scope, scope_id),
+        name=f"faiss-upgrade-{scope}-{scope_id}",
+        daemon=True,
+    ).start()
+
+
+def _upgrade_to_ann(scope: Literal["course", "group"], scope_id: int) -> None:
+    """Rebuild a flat scope index as IVF/HNSW. Training runs without the scope lock;
+    writes that landed meanwhile are replayed onto the new index before the swap.
+    """
+    try:
+        index = _read_index(scope, scope_id)
+        if index is None or _index_tier(index) != "flat":
+            return
+        vectors, ids = _extract_vectors(index, scope, scope_id)
+        upgraded = _build_index(vectors, ids, VECTOR_INDEX_ANN_TYPE, _index_compression(index))
+        with _scope_lock(scope, scope_id):
+            current = _read_index(scope, scope_id)
+            if current is None or _index_tier(current) != "flat":
+                return
+            current_vectors, current_ids = _extract_vectors(current, scope, scope_id)
+            added = ~np.isin(current_ids, ids)
+            if added.any():
+                upgraded.add_with_ids(current_vectors[added], current_ids[added])
+            deleted = ids[~np.isin(ids, current_ids)]
+            if len(deleted):
+                upgraded, _ = _remove_ids(upgraded, deleted, scope, scope_id)
+            _write_index(upgraded, _index_path(scope, scope_id))
+            invalidate_index_cache(scope, scope_id)
+        logger.info(
+            "Upgraded %s_%s index to %s (%d vectors)",
+            scope, scope_id, _index_tier(upgraded), upgraded.ntotal,
+        )
+    except Exception:
+        logger.exception("ANN upgrade failed for %s_%s; staying on flat index", scope, scope_id)
+    finally:
+        with _scope_locks_guard:
+            _upgrades_in_progress.discard((scope, scope_id))
+
+
+def _conversion_recall(
+    scope: Literal["course", "group"],
+    scope_id: int,
+    converted,
+    vectors: np.ndarray,
+    ids: np.ndarray,
+    n_queries: int,
+    k: int,
+) -> dict:
+    """recall@k of a converted index against an exact search over the vectors it was built from,
+    for sampled (slightly perturbed) stored vectors as queries: from the raw codes and through
+    the live search path (which rescores compressed indexes exactly).
+    """
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+    # Perturb stored vectors so queries aren't exact matches of a single row
+    queries = vectors[sample] + rng.normal(scale=0.01, size=(len(sample), vectors.shape[1])).astype(np.float32)
+    k = min(k, len(ids))
+    exact = _get_faiss().IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, rows = exact.search(queries, k)
+    truth = ids[rows]
+    _, raw = converted.search(queries, k)
+    rescored = [found for found, _ in _search_batch(scope, scope_id, queries, k)]
+
+    def recall(found) -> float:
+        hits = sum(len(set(f.tolist()) & set(t.tolist())) for f, t in zip(found, truth))
+        return hits / max(truth.size, 1)
+
+    return {"recall_k": k, "recall_raw": recall(raw), "recall_rescored": recall(rescored)}
+
+
+def convert_index(
+    scope: Literal["course", "group"],
+    scope_id: int,
+    compression: str,
+    recall_queries: int = 0,
+    recall_k: int = 5,
+) -> dict | None:
+    """Rebuild a scope index in another compression mode ('none', 'sq8', 'pq'), keeping its tier.
+    Returns memory-per-chunk before/after, or None if the scope has no index. With
+    recall_queries, also recall@recall_k of the new index against exact search (recall_raw
+    from the codes, recall_rescored as served).
+    """
+    with _scope_lock(scope, scope_id):
+        index = _read_index(scope, scope_id)
+        if index is None:
+            return None
+        before = _estimate_nbytes(index)
+        vectors, ids = _extract_vectors(index, scope, scope_id)
+        if len(ids):
+            converted = _build_index(vectors, ids, _index_tier(index), compression)
+        else:
+            converted = _new_index(index.d)
+        if _index_compression(converted) != "none":
+            _write_exact_vectors(scope, scope_id, vectors, ids)
+        _write_index(converted, _index_path(scope, scope_id))
+        if _index_compression(converted) == "none":
+            _delete_exact_vectors(scope, scope_id)
+        invalidate_index_cache(scope, scope_id)
+    ntotal = max(int(converted.ntotal), 1)
+    stats = {
+        "ntotal": int(converted.ntotal),
+        "tier": _index_tier(converted),
+        "compression": _index_compression(converted),
+        "bytes_per_chunk_before": before / ntotal,
+        "bytes_per_chunk_after": _estimate_nbytes(converted) / ntotal,
+    }
+    if recall_queries and len(ids):
+        stats.update(_conversion_recall(scope, scope_id, converted, vectors, ids, recall_queries, recall_k))
+    return stats
+
+
+def get_index_chunk_ids(scope: Literal["course", "group"], scope_id: int) -> np.ndarray | None:
+    """Chunk ids stored in a scope index, read from disk (not the cache). None if there is no index."""
+    index = _read_index(scope, scope_id)
+    return None if index is None else _index_ids(index)
+
+
+def get_exact_store_ids(scope: Literal["course", "group"], scope_id: int) -> np.ndarray | None:
+    """Chunk ids of the rows in a compressed scope's exact-vector store. None if it has none."""
+    ids_path = _exact_ids_path(scope, scope_id)
+    if not ids_path.exists():
+        return None
+    return np.fromfile(ids_path, dtype="<i8")
+
+
+def compact_index(scope: Literal["course", "group"], scope_id: int, live_ids: np.ndarray) -> dict | None:
+    """Drop vectors whose chunk ids are not in live_ids (chunks deleted from the DB) and rewrite a
+    compressed scope's exact-vector store without dead rows. Files are swapped atomically; temp
+    files of interrupted writes are removed (under the lock, so no live write loses its temp file).
+    Returns counts, or None if the scope has no index.
+    """
+    with _scope_lock(scope, scope_id):
+        for tmp_path in VECTOR_INDEX_DIR.glob(f"{scope}_{scope_id}.*.tmp"):
+            tmp_path.unlink(missing_ok=True)
+        index = _read_index(scope, scope_id)
+        if index is None:
+            return None
+        ids = _index_ids(index)
+        dead = ids[~np.isin(ids, live_ids)]
+        removed = 0
+        if len(dead):
+            index, removed = _remove_ids(index, dead, scope, scope_id)
+        exact_dropped = 0
+        if _index_compression(index) != "none":
+            exact = _load_exact_vectors(scope, scope_id, index.d)
+            stored = _index_ids(index)
+            if exact is not None:
+                keep = np.unique(stored)
+                vectors, found = exact.lookup(keep)
+                exact_dropped = int(len(exact._sorted_ids) - found.sum())
+                if exact_dropped:
+                    _write_exact_vectors(scope, scope_id, vectors[found], keep[found])
+        if removed:
+            _write_index(index, _index_path(scope, scope_id))
+        if removed or exact_dropped:
+            invalidate_index_cache(scope, scope_id)
+    return {"removed": removed, "exact_rows_dropped": exact_dropped, "ntotal": int(index.ntotal)}
+
+
+def rebuild_index(
+    scope: Literal["course", "group"],
+    scope_id: int,
+    vectors: np.ndarray,
+    chunk_ids: List[int],
+    known_ids: np.ndarray | None = None,
+) -> dict:
+    """Replace a scope index with one built from vectors (tier by size; compression kept from the
+    current index, else the configured mode).
+
+    Building runs without the scope lock. known_ids are the ids the live index held when the
+    caller read it: ids added to the live index since then (uploads during the rebuild) are
+    carried over before the atomic swap.
+    """
+    ids = np.asarray(chunk_ids, dtype=np.int64)
+    vectors = np.array(vectors, dtype=np.float32)
+    tier = "flat" if len(ids) < VECTOR_INDEX_ANN_THRESHOLD else VECTOR_INDEX_ANN_TYPE
+    # Keep the compression mode the scope was converted to, if any
+    existing = _read_index(scope, scope_id)
+    compression = _index_compression(existing) if existing is not None else None
+    rebuilt = _build_index(vectors, ids, tier, compression) if len(ids) else None
+    with _scope_lock(scope, scope_id):
+        current = _read_index(scope, scope_id)
+        if current is not None and known_ids is not None:
+            current_vectors, current_ids = _extract_vectors(current, scope, scope_id)
+            added = ~np.isin(current_ids, known_ids) & ~np.isin(current_ids, ids)
+            if added.any():
+                if rebuilt is None:
+                    vectors, ids = current_vectors[added], current_ids[added]
+                    rebuilt = _build_index(vectors, ids, "flat", compression)
+                else:
+                    rebuilt.add_with_ids(current_vectors[added], current_ids[added])
+                    vectors = np.concatenate([vectors, current_vectors[added]])
+                    ids = np.concatenate([ids, current_ids[added]])
+        if rebuilt is None:
+            if current is None:
+                return {"ntotal": 0, "tier": "flat", "compression": "none"}
+            rebuilt = _new_index(current.d)
+        if _index_compression(rebuilt) != "none":
+            # Exact rows first, so the index never references ids missing from the store
+            _write_exact_vectors(scope, scope_id, vectors, ids)
+        _write_index(rebuilt, _index_path(scope, scope_id))
+        if _index_compression(rebuilt) == "none":
+            _delete_exact_vectors(scope, scope_id)
+        invalidate_index_cache(scope, scope_id)
+    return {"ntotal": int(rebuilt.ntotal), "tier": _index_tier(rebuilt), "compression": _index_compression(rebuilt)}
+
+
+def _rescore_exact(
+    exact: _ExactVectors,
+    query_vector: np.ndarray,
+    candidate_ids: np.ndarray,
+    approx_distances: np.ndarray,
+    top_k: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Re-rank compressed-search candidates by exact L2 distance; keeps approximate distance for ids missing from the store.
+    Returns (ids, distances) of the top_k.
+    """
+    vectors, found = exact.lookup(candidate_ids)
+    distances = approx_distances.copy()
+    distances[found] = ((vectors[found] - query_vector) ** 2).sum(axis=1)
+    order = np.argsort(distances, kind="stable")[:top_k]
+    return candidate_ids[order], distances[order]
+
+
+def _search_batch(
+    scope: Literal["course", "group"],
+    scope_id: int,
+    query_vectors: np.ndarray,
+    top_k: int,
+) -> List[tuple[np.ndarray, np.ndarray]]:
+    """Per query row: (chunk ids, squared L2 distances) of the top_k nearest vectors, nearest first.
+    One FAISS search for all rows.
+    """
+    query_vectors = np.array(query_vectors, dtype=np.float32)
+    if query_vectors.ndim == 1:
+        query_vectors = query_vectors.reshape(1, -1)
+    entry = _load_cached(scope, scope_id)
+    if entry is None or entry.index.ntotal == 0:
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        return [empty] * len(query_vectors)
+    index = entry.index
+    if entry.exact is None:
+        distances, ids = index.search(query_vectors, min(top_k, index.ntotal))
+        # FAISS pads with -1 when fewer than k results are found
+        return [(row_ids[row_ids >= 0], row_d[row_ids >= 0]) for row_ids, row_d in zip(ids, distances)]
+    # Compressed index: over-fetch candidates from the codes, then rescore exactly
+    distances, ids = index.search(query_vectors, min(top_k * VECTOR_INDEX_RERANK_FACTOR, index.ntotal))
+    return [
+        _rescore_exact(entry.exact, q, row_ids[row_ids >= 0], row_d[row_ids >= 0], top_k)
+        for q, row_ids, row_d in zip(query_vectors, ids, distances)
+    ]
 
-    meta_path = _index_meta_path(scope, scope_id)
-    existing_ids = []
-    if meta_path.exists():
-        with open(meta_path, "r") as f:
-            existing_ids = [int(line.strip()) for line in f if line.strip()]
-    existing_ids.extend(chunk_ids)
-    with open(meta_path, "w") as f:
-        for i in existing_ids:
-            f.write(f"{i}\n")
 
-    faiss.write_index(index, str(_index_path(scope, scope_id)))
+def _search(
+    scope: Literal["course", "group"],
+    scope_id: int,
+    query_vector: np.ndarray,
+    top_k: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """(chunk ids, squared L2 distances) of the top_k nearest vectors, nearest first."""
+    return _search_batch(scope, scope_id, query_vector, top_k)[0]
 
 
 def search_index(
@@ -76,23 +865,119 @@ def search_index(
     query_vector: np.ndarray,
     top_k: int = 5,
 ) -> List[int]:
-    """Return chunk_ids (from meta file) for top_k nearest vectors. query_vector shape (1, dim)."""
-    path = _index_path(scope, scope_id)
-    if not path.exists():
-        return []
-    faiss = _get_faiss()
-    index = faiss.read_index(str(path))
-    if index.ntotal == 0:
-        return []
-    query_vector = np.array(query_vector, dtype=np.float32)
-    if query_vector.ndim == 1:
-        query_vector = query_vector.reshape(1, -1)
-    _, indices = index.search(query_vector, min(top_k, index.ntotal))
-    indices = indices[0].tolist()
-
-    meta_path = _index_meta_path(scope, scope_id)
-    if not meta_path.exists():
+    """Return chunk_ids for top_k nearest vectors. query_vector shape (1, dim)."""
+    ids, _ = _search(scope, scope_id, query_vector, top_k)
+    return [int(i) for i in ids.tolist()]
+
+
+class SearchResult(NamedTuple):
+    """Hits of one query, nearest first. Distances are squared L2 (lower is closer; for the
+    normalized MiniLM embeddings, 2 - 2 * cosine similarity).
+    """
+
+    chunk_ids: List[int]
+    distances: List[float]
+
+
+def search_index_batch(
+    scope: Literal["course", "group"],
+    scope_id: int,
+    query_vectors: np.ndarray,
+    top_k: int = 5,
+    max_distance: float | None = None,
+) -> List[SearchResult]:
+    """Search an (n, dim) matrix of queries with one FAISS call. Returns one SearchResult per
+    row; hits farther than max_distance (if given) are dropped.
+    """
+    results = []
+    for ids, distances in _search_batch(scope, scope_id, query_vectors, top_k):
+        if max_distance is not None:
+            keep = distances <= max_distance
+            ids, distances = ids[keep], distances[keep]
+        results.append(SearchResult([int(i) for i in ids.tolist()], [float(d) for d in distances.tolist()]))
+    return results
+
+
+class ScopedHit(NamedTuple):
+    """A federated search result, tagged with the scope index it came from."""
+
+    chunk_id: int
+    distance: float
+    scope: str
+    scope_id: int
+
+
+# Federated searches run one scope per thread (FAISS releases the GIL while searching)
+_FEDERATED_SEARCH_THREADS = 4
+_search_executor: ThreadPoolExecutor | None = None
+_search_executor_lock = threading.Lock()
+
+
+def _get_search_executor() -> ThreadPoolExecutor:
+    global _search_executor
+    with _search_executor_lock:
+        if _search_executor is None:
+            _search_executor = ThreadPoolExecutor(
+                max_workers=_FEDERATED_SEARCH_THREADS, thread_name_prefix="vector-search"
+            )
+        return _search_executor
+
+
+def shutdown_search_executor() -> None:
+    """Stop the federated search threads (call on app shutdown)."""
+    global _search_executor
+    with _search_executor_lock:
+        if _search_executor is not None:
+            _search_executor.shutdown(wait=False, cancel_futures=True)
+            _search_executor = None
+
+
+def federated_search(
+    scopes: List[tuple[Literal["course", "group"], int]],
+    query_vector: np.ndarray,
+    top_k: int = 5,
+    budget_ms: float = VECTOR_SEARCH_BUDGET_MS,
+) -> List[ScopedHit]:
+    """Search several scope indexes in parallel and merge the top_k by distance.
+
+    The others are dropped if they miss budget_ms (typically a cold index still loading from
+    disk, which keeps loading in the background and is cached for the next query). The first
+    scope is the one being asked about and is exempt: answering without it would use the wrong
+    material, and a single-scope search has no budget either. Blocks the calling thread, so
+    async callers run it via asyncio.to_thread.
+    """
+    if not scopes:
         return []
-    with open(meta_path, "r") as f:
-        chunk_ids = [int(line.strip()) for line in f if line.strip()]
-    return [chunk_ids[i] for i in indices if i < len(chunk_ids)]
+    results: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+    if len(scopes) == 1:
+        results[0] = _search(scopes[0][0], scopes[0][1], query_vector, top_k)
+    else:
+        executor = _get_search_executor()
+        futures = {executor.submit(_search, scope, scope_id, query_vector, top_k): i for i, (scope, scope_id) in enumerate(scopes)}
+        deadline = time.perf_counter() + budget_ms / 1000
+        pending = set(futures)
+        while pending:
+            primary_done = 0 in results
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0 and primary_done:
+                break
+            done, pending = wait(pending, timeout=None if timeout <= 0 else timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception:
+                    if i == 0:
+                        raise
+                    logger.exception("Federated search of %s %s failed, skipped", *scopes[i])
+        if pending:
+            late = [scopes[futures[f]] for f in pending]
+            logger.warning("Federated search: %s missed the %.0f ms budget, skipped", late, budget_ms)
+
+    hits = [
+        ScopedHit(int(chunk_id), float(distance), scopes[i][0], scopes[i][1])
+        for i, (ids, distances) in results.items()
+        for chunk_id, distance in zip(ids.tolist(), distances.tolist())
+    ]
+    hits.sort(key=lambda hit: hit.distance)
+    return hits[:top_k]
@@ -0,0 +1,69 @@
+"""Startup warm-up: load the embedding model and the most recently written indexes so the
+first Ask-AI after a deploy doesn't pay for them. The heavy modules are imported here, off
+the import path of app.main; /health/ready reports progress.
+"""
+import asyncio
+import logging
+import time
+
+from app.config import PRELOAD_INDEXES, PRELOAD_MODE
+
+logger = logging.getLogger(__name__)
+
+_state = {
+    "status": "pending",  # pending -> warming -> ready | failed
+    "mode": PRELOAD_MODE,
+    "model_seconds": None,
+    "indexes_loaded": 0,
+    "seconds": None,
+    "error": None,
+}
+_task: asyncio.Task | None = None
+
+
+def _warm_up() -> None:
+    from app.ai.embeddings import warm_up_embedding_model
+    from app.ai.vector_store import preload_indexes
+
+    started = time.perf_counter()
+    warm_up_embedding_model()
+    _state["model_seconds"] = round(time.perf_counter() - started, 3)
+    _state["indexes_loaded"] = preload_indexes(PRELOAD_INDEXES)
+    _state["seconds"] = round(time.perf_counter() - started, 3)
+
+
+async def _run() -> None:
+    _state["status"] = "warming"
+    try:
+        await asyncio.to_thread(_warm_up)
+    except Exception as e:
+        # Requests still load the model lazily; report the failure instead of blocking readiness forever
+        logger.exception("Warm-up failed")
+        _state["status"] = "failed"
+        _state["error"] = str(e)
+        return
+    _state["status"] = "ready"
+    logger.info(
+        "Warm-up done in %.2fs (model %.2fs, %d indexes)",
+        _state["seconds"], _state["model_seconds"], _state["indexes_loaded"],
+    )
+
+
+async def start_warm_up() -> None:
+    """Run warm-up according to PRELOAD_MODE. Called from the app lifespan."""
+    global _task
+    if PRELOAD_MODE == "off":
+        _state["status"] = "ready"
+    elif PRELOAD_MODE == "blocking":
+        await _run()
+    else:
+        _task = asyncio.create_task(_run(), name="warm-up")
+
+
+def is_ready() -> bool:
+    """False only while warm-up is still running."""
+    return _state["status"] in ("ready", "failed")
+
+
+def get_warm_up_state() -> dict:
+    return dict(_state)
@@ -24,13 +24,86 @@ DATABASE_URL = os.getenv(
 # RAG & uploads
 UPLOAD_DIR = BASE_DIR / "uploads"
 VECTOR_INDEX_DIR = BASE_DIR / "vector_indexes"
+# Memory budget for FAISS indexes kept resident between searches (LRU eviction)
+VECTOR_INDEX_CACHE_BYTES = int(os.getenv("VECTOR_INDEX_CACHE_BYTES", "268_435_456"))  # 256 MB
+# Scopes start on an exact flat index and move to an ANN index ("ivf" or "hnsw") past this many chunks
+VECTOR_INDEX_ANN_THRESHOLD = int(os.getenv("VECTOR_INDEX_ANN_THRESHOLD", "20_000"))
+VECTOR_INDEX_ANN_TYPE = os.getenv("VECTOR_INDEX_ANN_TYPE", "ivf").lower()
+VECTOR_INDEX_IVF_NPROBE = int(os.getenv("VECTOR_INDEX_IVF_NPROBE", "16"))
+VECTOR_INDEX_HNSW_M = int(os.getenv("VECTOR_INDEX_HNSW_M", "32"))
+VECTOR_INDEX_HNSW_EF_SEARCH = int(os.getenv("VECTOR_INDEX_HNSW_EF_SEARCH", "64"))
+# Opt-in compressed index codes ("none", "sq8" int8, or "pq"); top candidates are rescored exactly
+VECTOR_INDEX_COMPRESSION = os.getenv("VECTOR_INDEX_COMPRESSION", "none").lower()
+VECTOR_INDEX_PQ_M = int(os.getenv("VECTOR_INDEX_PQ_M", "48"))  # PQ sub-quantizers; must divide 384
+VECTOR_INDEX_RERANK_FACTOR = int(os.getenv("VECTOR_INDEX_RERANK_FACTOR", "4"))
 MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", "10_000_000"))  # 10 MB
 ALLOWED_EXTENSIONS = {".pdf", ".docx", ".txt"}
+# Embeddings: cache keys include the model, so changing it never serves stale vectors
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+# Inference backend: "sentence-transformers" (PyTorch) or "onnx" (onnxruntime, model exported with
+# scripts/export_onnx_embedding_model.py; EMBEDDING_ONNX_QUANTIZED picks the int8 variant)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers").lower()
+EMBEDDING_ONNX_DIR = Path(os.getenv("EMBEDDING_ONNX_DIR", str(BASE_DIR / "onnx_models" / "all-MiniLM-L6-v2")))
+EMBEDDING_ONNX_QUANTIZED = os.getenv("EMBEDDING_ONNX_QUANTIZED", "false").lower() == "true"
+EMBEDDING_CACHE_PATH = Path(os.getenv("EMBEDDING_CACHE_PATH", str(BASE_DIR / "embedding_cache.sqlite3")))
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "10_000"))
+# Rows kept in the on-disk embedding cache (~1.5 KB each at 384 dims); least recently used go first
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "500_000"))
+# Concurrent query embeddings are micro-batched: up to MAX_SIZE texts or MAX_WAIT_MS per forward pass
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+# Model forward passes run on a dedicated executor; queries beyond QUEUE_MAX waiting get a 503
+EMBEDDING_INFERENCE_THREADS = int(os.getenv("EMBEDDING_INFERENCE_THREADS", "1"))
+EMBEDDING_QUEUE_MAX = int(os.getenv("EMBEDDING_QUEUE_MAX", "256"))
+# Startup warm-up of the embedding model and the most recently written indexes: "background"
+# (serve at once; /health/ready is 503 until warm), "blocking" (warm before serving) or "off"
+PRELOAD_MODE = os.getenv("PRELOAD_MODE", "background").lower()
+PRELOAD_INDEXES = int(os.getenv("PRELOAD_INDEXES", "8"))
+# Token budget for the RAG prompt context (chat + materials); estimated at ~4 chars per token
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1500"))
+# Semantic answer cache: reuse an answer when a new question embeds within SIMILARITY (cosine)
+# of a cached one and the scope's index and chat window are unchanged; TTL 0 disables it
+RAG_ANSWER_CACHE_TTL_SECONDS = float(os.getenv("RAG_ANSWER_CACHE_TTL_SECONDS", "600"))
+RAG_ANSWER_CACHE_SIMILARITY = float(os.getenv("RAG_ANSWER_CACHE_SIMILARITY", "0.95"))
+RAG_ANSWER_CACHE_PER_SCOPE = int(os.getenv("RAG_ANSWER_CACHE_PER_SCOPE", "64"))
+RAG_ANSWER_CACHE_MAX_SCOPES = int(os.getenv("RAG_ANSWER_CACHE_MAX_SCOPES", "512"))
+# Hybrid retrieval: fuse FAISS and BM25 (lexical index built at ingestion) results by
+# reciprocal rank, score = sum 1 / (RRF_K + rank), over CANDIDATE_K hits from each
+RAG_HYBRID_SEARCH = os.getenv("RAG_HYBRID_SEARCH", "true").lower() == "true"
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+RAG_CANDIDATE_K = int(os.getenv("RAG_CANDIDATE_K", "20"))
+# Candidates are re-ranked by maximal marginal relevance: LAMBDA weighs relevance against
+# similarity to chunks already picked (1.0 = relevance only)
+RAG_MMR = os.getenv("RAG_MMR", "true").lower() == "true"
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+# Retrieved chunks that are consecutive in the same file are merged into one passage
+RAG_MERGE_ADJACENT_CHUNKS = os.getenv("RAG_MERGE_ADJACENT_CHUNKS", "true").lower() == "true"
+# Group queries also search the parent course's index; scopes beyond the first that don't
+# answer within VECTOR_SEARCH_BUDGET_MS are left out of the results
+RAG_FEDERATED_SEARCH = os.getenv("RAG_FEDERATED_SEARCH", "true").lower() == "true"
+VECTOR_SEARCH_BUDGET_MS = float(os.getenv("VECTOR_SEARCH_BUDGET_MS", "50"))
+# Lexical index segments per scope (one per upload) before they are merged into one
+LEXICAL_INDEX_MAX_SEGMENTS = int(os.getenv("LEXICAL_INDEX_MAX_SEGMENTS", "8"))
+# Background ingestion (extract -> chunk -> embed -> index) for uploads
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+INGESTION_EMBED_BATCH = int(os.getenv("INGESTION_EMBED_BATCH", "32"))
+# A running job whose worker sent no heartbeat (one per chunk batch) for this long is taken over
+# by another process; keep it above EXTRACTION_TIMEOUT_SECONDS
+INGESTION_LEASE_SECONDS = float(os.getenv("INGESTION_LEASE_SECONDS", "600"))
+# PDF text extraction runs in worker processes; a file that exceeds these limits is rejected
+EXTRACTION_PROCESSES = int(os.getenv("EXTRACTION_PROCESSES", str(min(4, os.cpu_count() or 1))))
+EXTRACTION_PAGES_PER_TASK = int(os.getenv("EXTRACTION_PAGES_PER_TASK", "8"))
+EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("EXTRACTION_TIMEOUT_SECONDS", "120"))
+EXTRACTION_MEMORY_LIMIT_MB = int(os.getenv("EXTRACTION_MEMORY_LIMIT_MB", "1024"))
 
 # Ollama
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen3:0.6b")
+# Pooled keep-alive connections to Ollama (app.http_clients)
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "8"))
 
 # ElevenLabs TTS (optional - voice AI assistant)
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY", "")
 ELEVENLABS_VOICE_ID = os.getenv("ELEVENLABS_VOICE_ID", "21m00Tcm4TlvDq8ikWAM")  # Rachel
+ELEVENLABS_BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io")
+ELEVENLABS_MAX_CONNECTIONS = int(os.getenv("ELEVENLABS_MAX_CONNECTIONS", "4"))
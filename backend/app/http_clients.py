@@ -0,0 +1,52 @@
+"""App-lifetime pooled HTTP clients, one per upstream (Ollama, ElevenLabs).
+
+Each upstream keeps its own keep-alive pool, connection limits and timeouts, so a slow
+LLM can't starve TTS of connections. HTTP/2 is negotiated (TLS upstreams) when the
+optional h2 package is installed. Clients are created on first use and closed in the
+app lifespan.
+"""
+import importlib.util
+from typing import Literal
+
+import httpx
+
+from app.config import ELEVENLABS_BASE_URL, ELEVENLABS_MAX_CONNECTIONS, OLLAMA_BASE_URL, OLLAMA_MAX_CONNECTIONS
+
+Upstream = Literal["ollama", "elevenlabs"]
+
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+_UPSTREAMS: dict[str, dict] = {
+    # Generations can take minutes on CPU; fail fast only when Ollama isn't there at all
+    "ollama": {
+        "base_url": OLLAMA_BASE_URL,
+        "timeout": httpx.Timeout(120.0, connect=5.0),
+        "limits": httpx.Limits(max_connections=OLLAMA_MAX_CONNECTIONS, max_keepalive_connections=OLLAMA_MAX_CONNECTIONS),
+    },
+    "elevenlabs": {
+        "base_url": ELEVENLABS_BASE_URL,
+        "timeout": httpx.Timeout(30.0, connect=5.0),
+        "limits": httpx.Limits(
+            max_connections=ELEVENLABS_MAX_CONNECTIONS, max_keepalive_connections=ELEVENLABS_MAX_CONNECTIONS
+        ),
+    },
+}
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def get_http_client(upstream: Upstream) -> httpx.AsyncClient:
+    """Shared client for an upstream; request paths are relative to its base URL."""
+    client = _clients.get(upstream)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(http2=_HTTP2, **_UPSTREAMS[upstream])
+        _clients[upstream] = client
+    return client
+
+
+async def close_http_clients() -> None:
+    """Close every pooled connection (lifespan shutdown)."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
@@ -1,13 +1,39 @@
 """StudyConnect FastAPI app — Phase 1 & 2 auth and multi-college with MySQL."""
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routers import auth_routes, college_routes, course_routes, dashboard_routes, websocket_routes, upload_routes, ai_routes
+from app.ai.embeddings import stop_embedding_batcher
+from app.ai.ingestion import start_ingestion_workers, stop_ingestion_workers
+from app.ai.summaries import stop_summary_refreshes
+from app.ai.text_utils import shutdown_extraction_pools
+from app.ai.vector_store import shutdown_search_executor
+from app.ai.warmup import start_warm_up
+from app.http_clients import close_http_clients
+from app.routers import auth_routes, college_routes, course_routes, dashboard_routes, health_routes, websocket_routes, upload_routes, ai_routes
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background workers and model warm-up on startup; stop them on shutdown."""
+    await start_ingestion_workers()
+    await start_warm_up()
+    yield
+    # Ingestion first: its in-flight jobs must see the shutdown before the model goes away
+    await stop_ingestion_workers()
+    await stop_summary_refreshes()
+    await stop_embedding_batcher()
+    shutdown_extraction_pools()
+    shutdown_search_executor()
+    await close_http_clients()
+
 
 app = FastAPI(
     title="StudyConnect API",
     description="Phase 1 & 2: Auth and multi-college with MySQL persistence.",
     version="0.2.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -18,6 +44,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.include_router(health_routes.router)
 app.include_router(college_routes.router)
 app.include_router(auth_routes.router)
 app.include_router(dashboard_routes.router)
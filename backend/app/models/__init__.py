@@ -11,10 +11,13 @@ from app.models.group_message import GroupMessage
 from app.models.file import File
 from app.models.document_chunk import DocumentChunk
 from app.models.voice_channel import VoiceChannel
+from app.models.ingestion_job import IngestionJob
+from app.models.course_summary import CourseSummary
 
 __all__ = [
     "Base", "College", "User", "UserRole",
     "Course", "Enrollment", "CourseMessage",
     "Group", "GroupMember", "GroupMessage",
     "File", "DocumentChunk", "VoiceChannel",
+    "IngestionJob", "CourseSummary",
 ]
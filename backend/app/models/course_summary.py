@@ -0,0 +1,22 @@
+"""Stored AI course summary with the watermark it was generated at."""
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, Integer, String, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class CourseSummary(Base):
+    __tablename__ = "course_summaries"
+
+    course_id: Mapped[int] = mapped_column(ForeignKey("courses.id", ondelete="CASCADE"), primary_key=True)
+    summary: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Watermark: newest course message and index version the summary covers
+    last_message_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    index_version: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # pending -> generating -> ready | failed (a failed refresh keeps the previous summary)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="pending")
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    generated_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,7 +1,7 @@
 """Document chunk model for RAG (chunk text stored; embeddings in FAISS)."""
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, Text, func
+from sqlalchemy import DateTime, ForeignKey, Integer, String, Text, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -13,6 +13,8 @@ class DocumentChunk(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     file_id: Mapped[int] = mapped_column(ForeignKey("files.id"), nullable=False, index=True)
     chunk_text: Mapped[str] = mapped_column(Text, nullable=False)
+    text_hash: Mapped[str | None] = mapped_column(String(64), nullable=True, index=True)  # sha256 of chunk_text
+    chunk_index: Mapped[int | None] = mapped_column(Integer, nullable=True)  # position within the file (0-based)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     file = relationship("File", back_populates="chunks")
@@ -0,0 +1,34 @@
+"""Ingestion job model: background extract -> chunk -> embed -> index for an uploaded file."""
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, Integer, String, Text, func
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from app.database import Base
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    scope: Mapped[str] = mapped_column(String(16), nullable=False)  # "course" | "group"
+    scope_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    file_id: Mapped[int | None] = mapped_column(ForeignKey("files.id", ondelete="SET NULL"), nullable=True, index=True)
+    filename: Mapped[str] = mapped_column(String(255), nullable=False)
+    # queued -> running -> done | failed
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="queued", index=True)
+    # extract | chunk | embed | index, while running
+    stage: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    chunks_total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)  # grows while streaming
+    chunks_done: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Chunks not re-encoded: embedding reused from an identical chunk, or already indexed in this scope
+    chunks_deduped: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Process running the job; its lease expires INGESTION_LEASE_SECONDS after the last heartbeat
+    owner: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    created_by: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    file = relationship("File")
@@ -1,22 +1,24 @@
 """RAG query and course summary endpoints."""
 import base64
+import json
 import logging
-from typing import Annotated
-
-import httpx
+import time
+from typing import Annotated, AsyncIterator
 
 logger = logging.getLogger(__name__)
-import numpy as np
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from app.ai.embeddings import encode_single
+from app.ai.embeddings import EmbeddingOverloadedError
 from app.ai.llama_client import OllamaUnavailableError
-from app.ai.rag import course_summary_rag, get_chunk_texts_by_ids, query_rag
-from app.ai.vector_store import search_index
+from app.ai.rag import get_context_version, query_rag, query_rag_stream
+from app.ai.single_flight import get_single_flight
+from app.ai.summaries import get_course_summary
 from app.config import ELEVENLABS_API_KEY, ELEVENLABS_VOICE_ID
-from app.database import get_db
+from app.database import SessionLocal, get_db
 from app.dependencies import get_current_user
+from app.http_clients import get_http_client
 from app.models import CourseMessage, User
 from app.routers.course_routes import _verify_enrollment, _verify_group_membership
 from app.schemas.ai_schema import AIQueryRequest, AIQueryResponse, AISummaryResponse, AIVoiceQueryResponse
@@ -24,6 +26,61 @@ from app.schemas.ai_schema import AIQueryRequest, AIQueryResponse, AISummaryResp
 router = APIRouter(tags=["ai"])
 
 
+def _recent_course_chat(db: Session, course_id: int) -> str:
+    """Last 50 course messages, chronological, so Ask AI can answer questions about the chat."""
+    messages = (
+        db.query(CourseMessage, User.email)
+        .join(User, User.id == CourseMessage.user_id)
+        .filter(CourseMessage.course_id == course_id)
+        .order_by(CourseMessage.created_at.desc())
+        .limit(50)
+        .all()
+    )
+    messages = list(reversed(messages))
+    return "\n".join(f"{email}: {m.content}" for m, email in messages) if messages else ""
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_answer(chunks: AsyncIterator[str], scope: str, scope_id: int, started: float) -> StreamingResponse:
+    """Wait for the first chunk (so retrieval or LLM failures still map to 503), then stream
+    'token' events followed by 'done', or 'error' if generation fails part-way.
+    """
+    try:
+        first = await anext(chunks, None)
+    except (OllamaUnavailableError, EmbeddingOverloadedError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=503, detail="AI service temporarily unavailable.") from e
+    logger.info("AI stream %s %d: first token after %.0f ms", scope, scope_id, (time.perf_counter() - started) * 1000)
+
+    async def events():
+        chars = 0
+        try:
+            if first is not None:
+                chars += len(first)
+                yield _sse("token", {"text": first})
+            async for text in chunks:
+                chars += len(text)
+                yield _sse("token", {"text": text})
+        except Exception as e:
+            logger.warning("AI stream %s %d failed mid-answer: %s", scope, scope_id, e)
+            detail = str(e) if isinstance(e, OllamaUnavailableError) else "AI service temporarily unavailable."
+            yield _sse("error", {"detail": detail})
+            return
+        logger.info(
+            "AI stream %s %d: done after %.0f ms, %d chars", scope, scope_id, (time.perf_counter() - started) * 1000, chars
+        )
+        yield _sse("done", {})
+
+    # X-Accel-Buffering: keep reverse proxies (nginx) from buffering the stream
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/courses/{course_id}/ai/query", response_model=AIQueryResponse)
 async def course_ai_query(
     course_id: int,
@@ -35,29 +92,85 @@ async def course_ai_query(
     _verify_enrollment(db, payload["user_id"], course_id, payload["college_id"])
     if not body.question or not body.question.strip():
         raise HTTPException(400, "question is required")
-    # Include last 50 course messages so Ask AI can answer questions about the chat
-    messages = (
-        db.query(CourseMessage, User.email)
-        .join(User, User.id == CourseMessage.user_id)
-        .filter(CourseMessage.course_id == course_id)
-        .order_by(CourseMessage.created_at.desc())
-        .limit(50)
-        .all()
-    )
-    messages = list(reversed(messages))  # chronological
-    recent_chat = "\n".join(f"{email}: {m.content}" for m, email in messages) if messages else ""
+    recent_chat = _recent_course_chat(db, course_id)
     try:
         answer = await query_rag(
             db, "course", course_id, body.question.strip(),
             recent_chat_snippet=recent_chat or None,
         )
-    except OllamaUnavailableError as e:
+    except (OllamaUnavailableError, EmbeddingOverloadedError) as e:
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=503, detail="AI service temporarily unavailable.") from e
     return AIQueryResponse(answer=answer)
 
 
+@router.post("/courses/{course_id}/ai/query/stream")
+async def course_ai_query_stream(
+    course_id: int,
+    body: AIQueryRequest,
+    payload: Annotated[dict, Depends(get_current_user)],
+    db: Session = Depends(get_db),
+):
+    """Streaming variant of course_ai_query: Server-Sent Events with the answer as it is generated."""
+    started = time.perf_counter()
+    _verify_enrollment(db, payload["user_id"], course_id, payload["college_id"])
+    if not body.question or not body.question.strip():
+        raise HTTPException(400, "question is required")
+    recent_chat = _recent_course_chat(db, course_id)
+    chunks = query_rag_stream(
+        db, "course", course_id, body.question.strip(),
+        recent_chat_snippet=recent_chat or None,
+    )
+    return await _stream_answer(chunks, "course", course_id, started)
+
+
+async def _text_to_speech(answer: str) -> str | None:
+    """ElevenLabs TTS for the start of the answer. Returns mp3 base64, or None if unavailable."""
+    api_key = (ELEVENLABS_API_KEY or "").strip()
+    if not api_key or api_key == "YOUR_ELEVENLABS_API_KEY":
+        print("[ElevenLabs] API key not configured; text-only response", flush=True)
+        return None
+    if not answer:
+        return None
+    # Try cheaper models first (eleven_turbo_v2), fall back to multilingual
+    models_to_try = ["eleven_turbo_v2", "eleven_multilingual_v2"]
+    # Free tier has ~20 credits: turbo = 1 credit/2 chars, multilingual = 1 credit/char
+    text_for_tts = answer[:40]  # ~20 credits with turbo, fits free tier
+    for model_id in models_to_try:
+        try:
+            print(f"[ElevenLabs] Calling TTS with model={model_id}...", flush=True)
+            resp = await get_http_client("elevenlabs").post(
+                f"/v1/text-to-speech/{ELEVENLABS_VOICE_ID}",
+                headers={
+                    "xi-api-key": api_key,
+                    "Content-Type": "application/json",
+                    "Accept": "audio/mpeg",
+                },
+                json={"text": text_for_tts, "model_id": model_id},
+            )
+            if resp.status_code == 200:
+                print(f"[ElevenLabs] TTS OK, model={model_id}, {len(resp.content)} bytes", flush=True)
+                return base64.b64encode(resp.content).decode("utf-8")
+            else:
+                print(f"[ElevenLabs] TTS FAILED model={model_id}: status={resp.status_code} body={resp.text[:300]}", flush=True)
+        except Exception as e:
+            print(f"[ElevenLabs] TTS error model={model_id}: {e}", flush=True)
+    return None
+
+
+async def _voice_answer(course_id: int, question: str, recent_chat: str) -> tuple[str, str | None]:
+    """RAG answer + TTS. Runs once per coalesced group with its own DB session,
+    so it doesn't depend on the request that happened to start it.
+    """
+    db = SessionLocal()
+    try:
+        answer = await query_rag(db, "course", course_id, question, recent_chat_snippet=recent_chat or None)
+    finally:
+        db.close()
+    return answer, await _text_to_speech(answer)
+
+
 @router.post("/courses/{course_id}/ai/voice-query", response_model=AIVoiceQueryResponse)
 async def course_ai_voice_query(
     course_id: int,
@@ -65,65 +178,27 @@ async def course_ai_voice_query(
     payload: Annotated[dict, Depends(get_current_user)],
     db: Session = Depends(get_db),
 ):
-    """RAG query + ElevenLabs TTS for voice channel Ask AI. Returns answer and optional audio_base64."""
+    """RAG query + ElevenLabs TTS for voice channel Ask AI. Returns answer and optional audio_base64.
+    Identical questions asked at the same moment in a course share one LLM and one TTS call.
+    """
     _verify_enrollment(db, payload["user_id"], course_id, payload["college_id"])
     if not body.question or not body.question.strip():
         raise HTTPException(400, "question is required")
 
-    print(f"[Voice] Received question: \"{body.question.strip()}\"", flush=True)
-
-    messages = (
-        db.query(CourseMessage, User.email)
-        .join(User, User.id == CourseMessage.user_id)
-        .filter(CourseMessage.course_id == course_id)
-        .order_by(CourseMessage.created_at.desc())
-        .limit(50)
-        .all()
-    )
-    messages = list(reversed(messages))
-    recent_chat = "\n".join(f"{email}: {m.content}" for m, email in messages) if messages else ""
+    question = body.question.strip()
+    print(f"[Voice] Received question: \"{question}\"", flush=True)
 
+    recent_chat = _recent_course_chat(db, course_id)
+    key = ("course", course_id, " ".join(question.lower().split()), get_context_version("course", course_id, recent_chat))
     try:
-        answer = await query_rag(
-            db, "course", course_id, body.question.strip(),
-            recent_chat_snippet=recent_chat or None,
+        answer, audio_base64 = await get_single_flight("voice_query").do(
+            key, lambda: _voice_answer(course_id, question, recent_chat)
         )
-    except OllamaUnavailableError as e:
+    except (OllamaUnavailableError, EmbeddingOverloadedError) as e:
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=503, detail="AI service temporarily unavailable.") from e
 
-    audio_base64 = None
-    api_key = (ELEVENLABS_API_KEY or "").strip()
-    if api_key and api_key != "YOUR_ELEVENLABS_API_KEY" and answer:
-        # Try cheaper models first (eleven_turbo_v2), fall back to multilingual
-        models_to_try = ["eleven_turbo_v2", "eleven_multilingual_v2"]
-        # Free tier has ~20 credits: turbo = 1 credit/2 chars, multilingual = 1 credit/char
-        text_for_tts = answer[:40]  # ~20 credits with turbo, fits free tier
-        for model_id in models_to_try:
-            try:
-                print(f"[ElevenLabs] Calling TTS with model={model_id}...", flush=True)
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    resp = await client.post(
-                        f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}",
-                        headers={
-                            "xi-api-key": api_key,
-                            "Content-Type": "application/json",
-                            "Accept": "audio/mpeg",
-                        },
-                        json={"text": text_for_tts, "model_id": model_id},
-                    )
-                    if resp.status_code == 200:
-                        audio_base64 = base64.b64encode(resp.content).decode("utf-8")
-                        print(f"[ElevenLabs] TTS OK, model={model_id}, {len(resp.content)} bytes", flush=True)
-                        break
-                    else:
-                        print(f"[ElevenLabs] TTS FAILED model={model_id}: status={resp.status_code} body={resp.text[:300]}", flush=True)
-            except Exception as e:
-                print(f"[ElevenLabs] TTS error model={model_id}: {e}", flush=True)
-    elif not api_key or api_key == "YOUR_ELEVENLABS_API_KEY":
-        print("[ElevenLabs] API key not configured; text-only response", flush=True)
-
     return AIVoiceQueryResponse(answer=answer, audio_base64=audio_base64)
 
 
@@ -134,47 +209,51 @@ async def group_ai_query(
     payload: Annotated[dict, Depends(get_current_user)],
     db: Session = Depends(get_db),
 ):
-    """RAG query over group materials. Uses local LLaMA."""
+    """RAG query over group materials and the parent course's materials. Uses local LLaMA."""
     _verify_group_membership(db, payload["user_id"], group_id, payload["college_id"])
     if not body.question or not body.question.strip():
         raise HTTPException(400, "question is required")
     try:
         answer = await query_rag(db, "group", group_id, body.question.strip())
-    except OllamaUnavailableError as e:
+    except (OllamaUnavailableError, EmbeddingOverloadedError) as e:
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=503, detail="AI service temporarily unavailable.") from e
     return AIQueryResponse(answer=answer)
 
 
+@router.post("/groups/{group_id}/ai/query/stream")
+async def group_ai_query_stream(
+    group_id: int,
+    body: AIQueryRequest,
+    payload: Annotated[dict, Depends(get_current_user)],
+    db: Session = Depends(get_db),
+):
+    """Streaming variant of group_ai_query: Server-Sent Events with the answer as it is generated."""
+    started = time.perf_counter()
+    _verify_group_membership(db, payload["user_id"], group_id, payload["college_id"])
+    if not body.question or not body.question.strip():
+        raise HTTPException(400, "question is required")
+    chunks = query_rag_stream(db, "group", group_id, body.question.strip())
+    return await _stream_answer(chunks, "group", group_id, started)
+
+
 @router.post("/courses/{course_id}/ai/summary", response_model=AISummaryResponse)
 async def course_ai_summary(
     course_id: int,
     payload: Annotated[dict, Depends(get_current_user)],
     db: Session = Depends(get_db),
 ):
-    """Summarize last 50 course messages + top document chunks. Uses local LLaMA."""
+    """Stored summary of the course discussion and materials. Returns at once; if messages or
+    materials changed since it was generated, an incremental refresh runs in the background
+    (poll until stale is false).
+    """
     _verify_enrollment(db, payload["user_id"], course_id, payload["college_id"])
-
-    messages = (
-        db.query(CourseMessage)
-        .filter(CourseMessage.course_id == course_id)
-        .order_by(CourseMessage.created_at.desc())
-        .limit(50)
-        .all()
+    row, stale = get_course_summary(db, course_id)
+    return AISummaryResponse(
+        summary=row.summary,
+        status=row.status,
+        stale=stale,
+        generated_at=row.generated_at,
+        error=row.error if row.status == "failed" else None,
     )
-    messages = list(reversed(messages))
-    chat_snippet = "\n".join(m.content for m in messages) if messages else "No discussion yet."
-
-    # Top 5 chunks: use a generic query to get 5 relevant chunks, or first 5 from index
-    try:
-        query_vec = encode_single("summary overview key points")
-        query_vec_np = np.array([query_vec], dtype=np.float32)
-        chunk_ids = search_index("course", course_id, query_vec_np, top_k=5)
-        top_chunk_texts = get_chunk_texts_by_ids(db, chunk_ids)
-        summary = await course_summary_rag(db, course_id, chat_snippet, top_chunk_texts)
-    except OllamaUnavailableError as e:
-        raise HTTPException(status_code=503, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=503, detail="AI service temporarily unavailable.") from e
-    return AISummaryResponse(summary=summary)
@@ -0,0 +1,33 @@
+"""Health endpoints: liveness, and readiness once the startup warm-up has finished."""
+import sys
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.ai.warmup import get_warm_up_state, is_ready
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get("/live")
+def live():
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+def ready():
+    """503 while the embedding model and hot indexes are still loading."""
+    body = {"ready": is_ready(), "warm_up": get_warm_up_state()}
+    # Only report cache stats for modules already loaded; don't import them from a probe
+    if "app.ai.vector_store" in sys.modules:
+        body["index_cache"] = sys.modules["app.ai.vector_store"].get_index_cache_stats()
+    if "app.ai.embeddings" in sys.modules:
+        body["embedding_cache"] = sys.modules["app.ai.embeddings"].get_embedding_cache_stats()
+        body["embedding_batcher"] = sys.modules["app.ai.embeddings"].get_embedding_batcher_stats()
+    if "app.ai.rag" in sys.modules:
+        body["answer_cache"] = sys.modules["app.ai.rag"].get_answer_cache_stats()
+    if "app.ai.ingestion" in sys.modules:
+        body["ingestion_dedup"] = sys.modules["app.ai.ingestion"].get_dedup_stats()
+    if "app.ai.single_flight" in sys.modules:
+        body["single_flight"] = sys.modules["app.ai.single_flight"].get_single_flight_stats()
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
@@ -1,4 +1,6 @@
 """Schemas for AI/RAG endpoints."""
+from datetime import datetime
+
 from pydantic import BaseModel
 
 
@@ -18,4 +20,10 @@ class AIVoiceQueryResponse(BaseModel):
 
 
 class AISummaryResponse(BaseModel):
-    summary: str
+    """Stored course summary. stale: newer messages/materials exist and a refresh is running."""
+
+    summary: str | None  # None until the first summary has been generated
+    status: str  # pending | generating | ready | failed
+    stale: bool
+    generated_at: datetime | None = None
+    error: str | None = None
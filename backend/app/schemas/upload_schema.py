@@ -0,0 +1,25 @@
+"""Schemas for file upload and ingestion job endpoints."""
+from pydantic import BaseModel
+
+
+class UploadAcceptedResponse(BaseModel):
+    """Upload stored; indexing continues in the background."""
+
+    job_id: int
+    file_id: int
+    filename: str
+    status: str
+
+
+class IngestionJobResponse(BaseModel):
+    job_id: int
+    scope: str
+    scope_id: int
+    file_id: int | None
+    filename: str
+    status: str  # queued | running | done | failed
+    stage: str | None = None  # extract | chunk | embed | index
+    chunks_total: int
+    chunks_done: int
+    chunks_deduped: int = 0  # reused an existing embedding or already indexed in this scope
+    error: str | None = None
@@ -0,0 +1,58 @@
+"""
+Compare n single-query search_index calls against one search_index_batch call over an (n, dim)
+matrix, on a synthetic index (random unit vectors) in a temporary directory. Checks that both
+return the same chunk ids and reports total time and the distance spread of the results.
+Run from backend directory: python scripts/bench_batch_search.py --chunks 50000 --queries 256
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Ensure backend app is on path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app.ai.vector_store as vector_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    # Keep the benchmark index out of the real vector_indexes/ directory
+    vector_store.VECTOR_INDEX_DIR = Path(tempfile.mkdtemp(prefix="bench_batch_"))
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.chunks, args.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    vector_store.add_vectors_to_index("course", 1, vectors, list(range(1, args.chunks + 1)))
+    # Queries near stored vectors, so distances span close and far hits
+    queries = vectors[rng.choice(args.chunks, args.queries)] + 0.05 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    vector_store.search_index("course", 1, queries[:1], args.k)  # load the index
+
+    t0 = time.perf_counter()
+    single = [vector_store.search_index("course", 1, q.reshape(1, -1), args.k) for q in queries]
+    t_single = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    batch = vector_store.search_index_batch("course", 1, queries, args.k)
+    t_batch = time.perf_counter() - t0
+
+    same = sum(s == b.chunk_ids for s, b in zip(single, batch))
+    distances = np.array([d for r in batch for d in r.distances])
+    print(f"{args.queries} queries over {args.chunks} chunks, k={args.k}")
+    print(f"single calls: {t_single * 1000:.1f} ms   batch: {t_batch * 1000:.1f} ms   ({t_single / t_batch:.1f}x)")
+    print(f"identical results: {same}/{args.queries}")
+    print(f"distance percentiles p10/p50/p90: {' / '.join(f'{v:.3f}' for v in np.percentile(distances, [10, 50, 90]))}")
+    cutoff = float(np.percentile(distances, 50))
+    kept = sum(len(r.chunk_ids) for r in vector_store.search_index_batch("course", 1, queries, args.k, max_distance=cutoff))
+    print(f"max_distance={cutoff:.3f} keeps {kept}/{distances.size} hits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Compare embedding backends: parity of ONNX (fp32 and int8) against sentence-transformers,
+and throughput of each at single-query and ingestion batch sizes.
+Parity reports per-text cosine similarity and top-5 retrieval agreement over a synthetic corpus;
+exits non-zero if any backend falls below --min-cosine.
+Run from backend directory (after scripts/export_onnx_embedding_model.py):
+    python scripts/bench_embedding_backends.py --texts 256
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Ensure backend app is on path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.ai.embeddings import OnnxBackend, SentenceTransformerBackend
+from app.config import EMBEDDING_MODEL_NAME, EMBEDDING_ONNX_DIR, INGESTION_EMBED_BATCH
+
+WORDS = (
+    "lecture midterm syllabus assignment derivative integral matrix vector theorem proof "
+    "algorithm complexity entropy gradient protein enzyme market equilibrium citation essay "
+    "CS101 MATH221 homework quiz deadline office hours lab report exam review chapter"
+).split()
+
+
+def make_texts(n: int, rng: random.Random) -> tuple[list[str], list[str]]:
+    """(queries, chunks): short questions and ~2400-char document chunks."""
+    queries = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12))) + "?" for _ in range(n)]
+    chunks = [" ".join(rng.choice(WORDS) for _ in range(350)) for _ in range(n)]
+    return queries, chunks
+
+
+def throughput(backend, texts: list[str], batch: int) -> float:
+    backend.encode(texts[:batch])  # warm-up
+    t0 = time.perf_counter()
+    for start in range(0, len(texts), batch):
+        backend.encode(texts[start : start + batch])
+    return len(texts) / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--onnx-dir", type=Path, default=EMBEDDING_ONNX_DIR)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    queries, chunks = make_texts(args.texts, random.Random(0))
+    backends = {
+        "sentence-transformers": SentenceTransformerBackend(EMBEDDING_MODEL_NAME),
+        "onnx": OnnxBackend(args.onnx_dir, quantized=False),
+        "onnx-int8": OnnxBackend(args.onnx_dir, quantized=True),
+    }
+
+    reference_q = backends["sentence-transformers"].encode(queries)
+    reference_c = backends["sentence-transformers"].encode(chunks)
+    reference_top = np.argsort(-reference_q @ reference_c.T, axis=1)[:, :5]
+
+    failed = False
+    print(f"{args.texts} queries + {args.texts} chunks, model {EMBEDDING_MODEL_NAME}\n")
+    print(f"{'backend':<22} {'min cos':>8} {'mean cos':>9} {'top5 agree':>11} {'q/s (1)':>9} {'chunks/s':>9}")
+    for name, backend in backends.items():
+        q = backend.encode(queries)
+        c = backend.encode(chunks)
+        cos = np.concatenate([
+            (q * reference_q).sum(1) / (np.linalg.norm(q, axis=1) * np.linalg.norm(reference_q, axis=1)),
+            (c * reference_c).sum(1) / (np.linalg.norm(c, axis=1) * np.linalg.norm(reference_c, axis=1)),
+        ])
+        top = np.argsort(-q @ c.T, axis=1)[:, :5]
+        agree = np.mean([len(set(a) & set(b)) / 5 for a, b in zip(top, reference_top)])
+        single = throughput(backend, queries[:64], 1)
+        batched = throughput(backend, chunks, INGESTION_EMBED_BATCH)
+        print(f"{name:<22} {cos.min():>8.4f} {cos.mean():>9.4f} {agree:>10.1%} {single:>9.1f} {batched:>9.1f}")
+        failed |= cos.min() < args.min_cosine
+    if failed:
+        sys.exit(f"\nParity check failed: cosine below {args.min_cosine}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Latency of federated group + parent-course vector search against searching each index in turn.
+Builds two synthetic indexes (random unit vectors) in a temporary directory, then reports
+per-query latency for: group only, group then course sequentially, and federated_search
+(parallel, merged by distance), both with warm indexes and with the course index cold.
+Run from backend directory: python scripts/bench_federated_search.py --group-chunks 2000 --course-chunks 50000
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Ensure backend app is on path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app.ai.vector_store as vector_store
+from app.config import VECTOR_SEARCH_BUDGET_MS
+
+
+def _vectors(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    v = rng.standard_normal((n, dim)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def _timed(fn, queries: np.ndarray) -> list[float]:
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q.reshape(1, -1))
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--group-chunks", type=int, default=2000)
+    parser.add_argument("--course-chunks", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    # Keep the benchmark indexes out of the real vector_indexes/ directory
+    vector_store.VECTOR_INDEX_DIR = Path(tempfile.mkdtemp(prefix="bench_federated_"))
+    rng = np.random.default_rng(0)
+    group = _vectors(args.group_chunks, args.dim, rng)
+    course = _vectors(args.course_chunks, args.dim, rng)
+    vector_store.add_vectors_to_index("group", 1, group, list(range(1, args.group_chunks + 1)))
+    course_ids = list(range(args.group_chunks + 1, args.group_chunks + args.course_chunks + 1))
+    vector_store.add_vectors_to_index("course", 1, course, course_ids)
+    queries = _vectors(args.queries, args.dim, rng)
+    scopes = [("group", 1), ("course", 1)]
+
+    def sequential(q):
+        return vector_store.search_index("group", 1, q, args.k) + vector_store.search_index("course", 1, q, args.k)
+
+    modes = {
+        "group only": lambda q: vector_store.search_index("group", 1, q, args.k),
+        "sequential": sequential,
+        "federated": lambda q: vector_store.federated_search(scopes, q, args.k),
+    }
+    print(f"group {args.group_chunks} + course {args.course_chunks} chunks, dim {args.dim}, k={args.k}, budget {VECTOR_SEARCH_BUDGET_MS:.0f} ms\n")
+    print(f"{'mode':<12} {'mean ms':>8} {'p95 ms':>7}")
+    for name, fn in modes.items():
+        fn(queries[:1])  # load both indexes
+        latencies = _timed(fn, queries)
+        print(f"{name:<12} {statistics.mean(latencies):>8.2f} {latencies[int(len(latencies) * 0.95) - 1]:>7.2f}")
+
+    hits = vector_store.federated_search(scopes, queries[:1], args.k)
+    print("\nsources of one federated top-k:", [f"{h.scope}:{h.chunk_id}" for h in hits])
+
+    # Cold course index: the first federated query returns within the budget with group hits only
+    vector_store.invalidate_index_cache("course", 1)
+    t0 = time.perf_counter()
+    hits = vector_store.federated_search(scopes, queries[:1], args.k)
+    print(
+        f"cold course index: {(time.perf_counter() - t0) * 1000:.1f} ms, "
+        f"sources {sorted({h.scope for h in hits})}"
+    )
+    vector_store.shutdown_search_executor()
+
+
+if __name__ == "__main__":
+    main()
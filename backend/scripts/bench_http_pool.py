@@ -0,0 +1,105 @@
+"""
+Show connection reuse of the pooled Ollama client against a local stub server.
+Sends the same generate() calls once with a fresh httpx.AsyncClient per request (the old
+behaviour) and once through app.http_clients, and reports TCP connections opened and latency.
+Run from backend directory: python scripts/bench_http_pool.py --requests 200 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Ensure backend app is on path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class _StubOllama(BaseHTTPRequestHandler):
+    """Minimal /api/generate (non-streaming) with HTTP/1.1 keep-alive; counts connections."""
+
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with _StubOllama.lock:
+            _StubOllama.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({"response": "<think>x</think>stub answer", "done": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+async def run(generate_one, requests: int, concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            t0 = time.perf_counter()
+            await generate_one()
+            latencies.append(time.perf_counter() - t0)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    # Point the app at the stub before app.config is imported
+    os.environ["OLLAMA_BASE_URL"] = base_url
+
+    import httpx
+
+    from app.ai.llama_client import generate
+    from app.http_clients import close_http_clients
+
+    async def per_request_client():
+        async with httpx.AsyncClient(timeout=120.0) as client:
+            resp = await client.post(f"{base_url}/api/generate", json={"prompt": "q", "stream": False})
+            resp.raise_for_status()
+
+    async def pooled():
+        await generate("q")
+
+    async def bench():
+        for name, fn in (("client per request", per_request_client), ("pooled client", pooled)):
+            _StubOllama.connections = 0
+            t0 = time.perf_counter()
+            latencies = await run(fn, args.requests, args.concurrency)
+            total = time.perf_counter() - t0
+            print(
+                f"{name:<19} connections={_StubOllama.connections:<4} total={total:.2f} s  "
+                f"mean={statistics.mean(latencies) * 1000:.1f} ms  "
+                f"p95={sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms"
+            )
+        await close_http_clients()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, stub at {base_url}\n")
+    asyncio.run(bench())
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Effect and cost of MMR re-ranking on retrieval results.
+Synthetic candidates come in clusters of near-duplicate vectors (like neighbouring chunks of one
+file that share their overlap and topic). For plain top-k and MMR top-k, reports the number of
+distinct clusters covered, the mean pairwise cosine similarity of the results and the mean
+relevance kept, plus MMR latency per query for the candidate pool size.
+Run from backend directory: python scripts/bench_mmr_rerank.py --pool 20 --k 5
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Ensure backend app is on path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.ai.rag import mmr_select
+from app.config import RAG_MMR_LAMBDA
+
+
+def make_candidates(pool: int, cluster_size: int, dim: int, rng: np.random.Generator):
+    """(query, candidate vectors, cluster id per candidate), candidates sorted by relevance."""
+    query = rng.standard_normal(dim)
+    n_clusters = -(-pool // cluster_size)
+    # Cluster centres at decreasing similarity to the query
+    centres = [query * (1.0 - 0.08 * c) + rng.standard_normal(dim) * (0.6 + 0.1 * c) for c in range(n_clusters)]
+    vectors = np.stack([centres[i // cluster_size] + 0.15 * rng.standard_normal(dim) for i in range(pool)])
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    clusters = np.arange(pool) // cluster_size
+    relevance = vectors @ (query / np.linalg.norm(query))
+    order = np.argsort(-relevance)
+    return relevance[order].astype(np.float32), vectors[order], clusters[order]
+
+
+def describe(picked: list[int], relevance: np.ndarray, vectors: np.ndarray, clusters: np.ndarray) -> tuple[int, float, float]:
+    chosen = vectors[picked]
+    sim = chosen @ chosen.T
+    pairs = sim[np.triu_indices(len(picked), 1)]
+    return len(set(clusters[picked].tolist())), float(pairs.mean()), float(relevance[picked].mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pool", type=int, default=20, help="candidates per query (RAG_CANDIDATE_K)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--cluster-size", type=int, default=3, help="near-duplicates per cluster")
+    parser.add_argument("--lambda", dest="lambda_", type=float, default=RAG_MMR_LAMBDA)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rows = {"top-k": [], "mmr": []}
+    latencies = []
+    for _ in range(args.queries):
+        relevance, vectors, clusters = make_candidates(args.pool, args.cluster_size, args.dim, rng)
+        rows["top-k"].append(describe(list(range(args.k)), relevance, vectors, clusters))
+        t0 = time.perf_counter()
+        picked = mmr_select(relevance, vectors, args.k, args.lambda_)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        rows["mmr"].append(describe(picked, relevance, vectors, clusters))
+
+    print(f"{args.queries} queries, pool {args.pool}, k={args.k}, clusters of {args.cluster_size}, lambda {args.lambda_}\n")
+    print(f"{'ranking':<7} {'clusters':>9} {'pair cos':>9} {'relevance':>10}")
+    for name, values in rows.items():
+        clusters, pair_cos, relevance = (statistics.mean(v) for v in zip(*values))
+        print(f"{name:<7} {clusters:>9.2f} {pair_cos:>9.3f} {relevance:>10.3f}")
+    latencies.sort()
+    print(f"\nMMR latency: mean {statistics.mean(latencies):.3f} ms, p95 {latencies[int(len(latencies) * 0.95) - 1]:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark application startup: import time of app.main (fresh interpreter per run), which heavy
+ML modules the import pulls in, and time from lifespan start to /health/ready with warm-up.
+Run from backend directory: python scripts/bench_startup.py --runs 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# Ensure backend app is on path
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Must stay off the import path of app.main; warm-up loads them in the background
+HEAVY_MODULES = ("torch", "sentence_transformers", "transformers", "onnxruntime", "faiss")
+
+
+def import_profile() -> tuple[float, list[tuple[int, str]]]:
+    """Total import seconds and (cumulative_us, module) for app.* and third-party top-level modules."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if not cumulative.isdigit():
+            continue
+        rows.append((int(cumulative), name))
+    total = next(us for us, name in rows if name == "app.main") / 1e6
+    top_level = [(us, name) for us, name in rows if name != "app.main" and ("." not in name or name.startswith("app."))]
+    return total, sorted(top_level, reverse=True)
+
+
+def heavy_imports() -> list[str]:
+    code = f"import sys, app.main; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    return [m for m in result.stdout.strip().split(",") if m]
+
+
+def time_to_ready(timeout: float) -> tuple[float, dict]:
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    t0 = time.perf_counter()
+    with TestClient(app) as client:
+        started = time.perf_counter() - t0
+        while True:
+            resp = client.get("/health/ready")
+            if resp.status_code == 200 or time.perf_counter() - t0 > timeout:
+                break
+            time.sleep(0.05)
+        ready = time.perf_counter() - t0
+        body = resp.json()
+    print(f"lifespan startup: {started * 1000:.0f} ms (server accepts requests)")
+    return ready, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh-interpreter import runs")
+    parser.add_argument("--top", type=int, default=12, help="slowest modules to list")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for readiness")
+    args = parser.parse_args()
+
+    totals = []
+    for _ in range(args.runs):
+        total, modules = import_profile()
+        totals.append(total)
+    print(f"import app.main: median {statistics.median(totals) * 1000:.0f} ms over {args.runs} runs")
+    print("slowest imports (cumulative, last run):")
+    for us, name in modules[: args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    heavy = heavy_imports()
+    print(f"heavy ML modules imported by app.main: {', '.join(heavy) if heavy else 'none'}")
+
+    ready, body = time_to_ready(args.timeout)
+    warm_up = body["warm_up"]
+    print(
+        f"time to ready: {ready:.2f} s (mode={warm_up['mode']}, status={warm_up['status']}, "
+        f"model {warm_up['model_seconds']} s, {warm_up['indexes_loaded']} indexes)"
+    )
+    if warm_up["error"]:
+        print(f"warm-up error: {warm_up['error']}")
+    if heavy:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark PDF text extraction: single-process pypdf vs the process-pool extractor.
+Generates a corpus of text PDFs, then reports total time and time-to-first-page per file.
+Run from backend directory: python scripts/bench_text_extraction.py --files 5 --pages 200
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Ensure backend app is on path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.ai import text_utils
+
+WORDS = (
+    "lecture midterm syllabus assignment derivative integral matrix vector theorem proof "
+    "algorithm complexity entropy gradient protein enzyme market equilibrium citation essay"
+).split()
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: Path, pages: int, lines_per_page: int, rng: random.Random) -> None:
+    """Minimal PDF 1.4 writer: one Helvetica text stream per page, correct xref offsets."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for _ in range(pages):
+        lines = [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(lines_per_page)]
+        ops = ["BT", "/F1 10 Tf", "12 TL", "40 800 Td"]
+        ops += [f"({_escape(line)}) Tj T*" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_num = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_num
+        )
+        page_refs.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % n for n in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % num + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+
+
+def sequential(path: Path) -> tuple[float, float, int]:
+    from pypdf import PdfReader
+    t0 = time.perf_counter()
+    first = None
+    chars = 0
+    for page in PdfReader(path).pages:
+        chars += len(page.extract_text() or "")
+        if first is None:
+            first = time.perf_counter() - t0
+    return time.perf_counter() - t0, first or 0.0, chars
+
+
+def pooled(path: Path) -> tuple[float, float, int]:
+    t0 = time.perf_counter()
+    first = None
+    chars = 0
+    for text in text_utils.iter_pdf_pages(path):
+        chars += len(text)
+        if first is None:
+            first = time.perf_counter() - t0
+    return time.perf_counter() - t0, first or 0.0, chars
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=50, help="text lines per page")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = []
+        for i in range(args.files):
+            path = Path(tmp) / f"doc_{i}.pdf"
+            write_pdf(path, args.pages, args.lines, rng)
+            corpus.append(path)
+        size_mb = sum(p.stat().st_size for p in corpus) / 1e6
+        print(
+            f"{args.files} PDFs x {args.pages} pages ({size_mb:.1f} MB), "
+            f"{text_utils.EXTRACTION_PROCESSES} processes, {text_utils.EXTRACTION_PAGES_PER_TASK} pages/task\n"
+        )
+        # Warm the pool so process spawn isn't billed to the first file
+        list(text_utils.iter_pdf_pages(corpus[0]))
+
+        for name, fn in (("sequential", sequential), ("process pool", pooled)):
+            totals, firsts = [], []
+            for path in corpus:
+                total, first, chars = fn(path)
+                totals.append(total)
+                firsts.append(first)
+            print(
+                f"{name:<13} total={sum(totals):.2f} s  per-file={sum(totals) / len(totals):.2f} s  "
+                f"first-page={sum(firsts) / len(firsts) * 1000:.0f} ms  ({chars} chars/file)"
+            )
+    text_utils.shutdown_extraction_pools()
+
+
+if __name__ == "__main__":
+    main()
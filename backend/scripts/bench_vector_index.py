@@ -0,0 +1,96 @@
+"""
+Recall-vs-latency benchmark for the vector index tiers (flat / IVF-Flat / HNSW).
+Uses synthetic clustered vectors shaped like MiniLM embeddings; the flat index is the exact baseline.
+Run from backend directory: python scripts/bench_vector_index.py --n 50000 --queries 500
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Ensure backend app is on path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app.ai.vector_store as vector_store
+
+
+def make_corpus(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Gaussian clusters on the unit sphere, roughly how sentence embeddings distribute."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    x = centers[labels] + 0.35 * rng.normal(size=(n, dim)).astype(np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x.astype(np.float32)
+
+
+def run_queries(index, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Search one query at a time (as Ask-AI does). Returns (ids, per-query seconds)."""
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    timings = np.empty(len(queries))
+    for i, q in enumerate(queries):
+        t0 = time.perf_counter()
+        _, found = index.search(q.reshape(1, -1), k)
+        timings[i] = time.perf_counter() - t0
+        ids[i] = found[0]
+    return ids, timings
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f.tolist()) & set(t.tolist())) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def report(name: str, found: np.ndarray, timings: np.ndarray, truth: np.ndarray) -> None:
+    ms = timings * 1000
+    print(
+        f"{name:<22} recall@k={recall_at_k(found, truth):.3f}  "
+        f"mean={ms.mean():.3f} ms  p95={np.percentile(ms, 95):.3f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=50_000, help="corpus size (chunks)")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    faiss = vector_store._get_faiss()
+    corpus = make_corpus(args.n + args.queries, args.dim, args.clusters, args.seed)
+    vectors, queries = corpus[: args.n], corpus[args.n :]
+    ids = np.arange(args.n, dtype=np.int64)
+    print(f"n={args.n} dim={args.dim} queries={args.queries} k={args.k}\n")
+
+    flat = vector_store._new_index(args.dim)
+    flat.add_with_ids(vectors, ids)
+    truth, timings = run_queries(flat, queries, args.k)
+    report("flat (baseline)", truth, timings, truth)
+
+    t0 = time.perf_counter()
+    ivf = vector_store._build_index(vectors, ids, "ivf", "none")
+    print(f"\nivf build: {time.perf_counter() - t0:.2f} s, nlist={ivf.nlist}")
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        found, timings = run_queries(ivf, queries, args.k)
+        report(f"ivf nprobe={nprobe}", found, timings, truth)
+
+    t0 = time.perf_counter()
+    hnsw = vector_store._build_index(vectors, ids, "hnsw", "none")
+    print(f"\nhnsw build: {time.perf_counter() - t0:.2f} s, M={vector_store.VECTOR_INDEX_HNSW_M}")
+    inner = faiss.downcast_index(hnsw.index)
+    for ef in args.ef_search:
+        inner.hnsw.efSearch = ef
+        found, timings = run_queries(hnsw, queries, args.k)
+        report(f"hnsw efSearch={ef}", found, timings, truth)
+
+
+if __name__ == "__main__":
+    main()
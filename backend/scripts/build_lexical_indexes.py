@@ -0,0 +1,56 @@
+"""
+Build the BM25 lexical index for scopes indexed before hybrid retrieval existed (or rebuild it).
+Indexes exactly the chunk ids stored in each scope's FAISS index, reading their text from the DB.
+Run from backend directory: python scripts/build_lexical_indexes.py [--scope course --scope-id 12] [--force]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Ensure backend app is on path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app.ai.vector_store as vector_store
+from app.ai.lexical_index import has_lexical_index, rebuild_index
+from app.database import SessionLocal
+from app.models import DocumentChunk
+
+# Chunk texts fetched per query
+_FETCH_BATCH = 500
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scope", choices=["course", "group"])
+    parser.add_argument("--scope-id", type=int)
+    parser.add_argument("--force", action="store_true", help="rebuild scopes that already have a lexical index")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.scope and args.scope_id is not None:
+            scopes = [(args.scope, args.scope_id)]
+        else:
+            scopes = vector_store.list_index_scopes(args.scope)
+        for scope, scope_id in scopes:
+            if has_lexical_index(scope, scope_id) and not args.force:
+                continue
+            indexed = vector_store.get_index_chunk_ids(scope, scope_id)
+            ids = indexed.tolist() if indexed is not None else []
+            chunk_ids, texts = [], []
+            for start in range(0, len(ids), _FETCH_BATCH):
+                rows = (
+                    db.query(DocumentChunk.id, DocumentChunk.chunk_text)
+                    .filter(DocumentChunk.id.in_(ids[start : start + _FETCH_BATCH]))
+                    .all()
+                )
+                chunk_ids.extend(r.id for r in rows)
+                texts.extend(r.chunk_text for r in rows)
+            rebuild_index(scope, scope_id, chunk_ids, texts)
+            print(f"{scope} {scope_id}: {len(chunk_ids)} chunks indexed ({len(ids) - len(chunk_ids)} missing from DB)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Convert existing vector indexes to another compression mode (none / sq8 / pq).
+Reports memory per chunk before and after, and recall@k of the compressed index
+(raw codes and with exact rescoring) against an exact flat search over the same vectors.
+Run from backend directory: python scripts/convert_vector_indexes.py --compression sq8
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Ensure backend app is on path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app.ai.vector_store as vector_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compression", choices=["none", "sq8", "pq"], required=True)
+    parser.add_argument("--scope", choices=["course", "group"])
+    parser.add_argument("--scope-id", type=int)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200, help="sampled stored vectors used as recall queries")
+    args = parser.parse_args()
+
+    if args.scope and args.scope_id is not None:
+        scopes = [(args.scope, args.scope_id)]
+    else:
+        scopes = vector_store.list_index_scopes(args.scope)
+    for scope, scope_id in scopes:
+        stats = vector_store.convert_index(
+            scope, scope_id, args.compression, recall_queries=args.queries, recall_k=args.k
+        )
+        if stats is None or stats["ntotal"] == 0:
+            continue
+        print(
+            f"{scope}_{scope_id}: {stats['ntotal']} chunks, {stats['tier']}/{stats['compression']}  "
+            f"bytes/chunk {stats['bytes_per_chunk_before']:.0f} -> {stats['bytes_per_chunk_after']:.0f}  "
+            f"recall@{stats['recall_k']} raw={stats['recall_raw']:.3f} rescored={stats['recall_rescored']:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
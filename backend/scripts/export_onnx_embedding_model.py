@@ -0,0 +1,67 @@
+"""
+Export the sentence-transformers embedding model to ONNX for EMBEDDING_BACKEND=onnx.
+Writes model.onnx, model_int8.onnx (dynamic int8 quantization), tokenizer.json and
+embedding_config.json into EMBEDDING_ONNX_DIR (or --out).
+Needs torch, sentence-transformers and onnxruntime; the server itself then only needs onnxruntime.
+Run from backend directory: python scripts/export_onnx_embedding_model.py
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Ensure backend app is on path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import EMBEDDING_MODEL_NAME, EMBEDDING_ONNX_DIR
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--out", type=Path, default=EMBEDDING_ONNX_DIR)
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    model = SentenceTransformer(args.model, device="cpu")
+    pooling = next(m for m in model if isinstance(m, Pooling))
+    if not pooling.pooling_mode_mean_tokens:
+        sys.exit(f"{args.model} does not use mean pooling; the ONNX backend only implements mean pooling")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+
+    args.out.mkdir(parents=True, exist_ok=True)
+    tokenizer.backend_tokenizer.save(str(args.out / "tokenizer.json"))
+    (args.out / "embedding_config.json").write_text(json.dumps({
+        "model": args.model,
+        "max_seq_length": model.max_seq_length,
+        "normalize": any(isinstance(m, Normalize) for m in model),
+    }, indent=2))
+
+    sample = tokenizer(["An example sentence to trace the graph."], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic = {"0": "batch", "1": "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            str(args.out / "model.onnx"),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: dynamic["0"], 1: dynamic["1"]} for name in input_names + ["last_hidden_state"]},
+            opset_version=args.opset,
+        )
+    quantize_dynamic(str(args.out / "model.onnx"), str(args.out / "model_int8.onnx"), weight_type=QuantType.QInt8)
+
+    for name in ("model.onnx", "model_int8.onnx"):
+        print(f"{args.out / name}: {(args.out / name).stat().st_size / 1e6:.1f} MB")
+    print("Check parity with: python scripts/bench_embedding_backends.py")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Check, compact and rebuild the per-scope indexes under vector_indexes/ against the database.
+
+  check    compare each FAISS index (and BM25 lexical index) with the scope's DocumentChunk rows:
+           chunks missing from the index, vectors of deleted chunks, duplicate ids, exact-store
+           drift of compressed indexes, leftover temp files and legacy sidecars; exits 1 on drift
+  compact  drop vectors and lexical entries of deleted chunks, dead rows of exact-vector
+           stores and temp files left by interrupted writes; prune the embedding cache (rows of
+           other models, least recently used rows beyond EMBEDDING_CACHE_MAX_ROWS)
+  rebuild  rebuild indexes from the stored chunks: stored vectors are reused (--reembed to
+           re-encode everything), missing ones are embedded through the embedding cache, --workers
+           batches at a time on as many model inference threads
+
+Every write goes to a temp file and is renamed into place under the scope's file lock, so it
+serializes with the server's writes and live searches never see a half-written index; servers
+pick the new files up on their next read (cached indexes and answers are keyed by file version).
+Files whose ingestion job is still queued or running are left out.
+Run from backend directory: python scripts/maintain_vector_indexes.py check [--scope course --scope-id 12]
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# Ensure backend app is on path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app.ai.lexical_index as lexical_index
+import app.ai.vector_store as vector_store
+from app.ai.embeddings import encode, prune_embedding_cache, set_inference_threads
+from app.config import INGESTION_EMBED_BATCH, VECTOR_INDEX_DIR
+from app.database import SessionLocal
+from app.models import DocumentChunk, File, IngestionJob
+
+# Chunk texts fetched per query
+_FETCH_BATCH = 500
+
+
+def _scopes(db, scope: str | None, scope_id: int | None) -> list[tuple[str, int]]:
+    """Scopes with an index file or with chunks in the DB."""
+    if scope and scope_id is not None:
+        return [(scope, scope_id)]
+    found = set(vector_store.list_index_scopes())
+    rows = db.query(File.course_id, File.group_id).join(DocumentChunk, DocumentChunk.file_id == File.id).distinct()
+    for course_id, group_id in rows:
+        found.add(("group", group_id) if group_id is not None else ("course", course_id))
+    return sorted(s for s in found if scope is None or s[0] == scope)
+
+
+def _db_chunk_ids(db, scope: str, scope_id: int) -> np.ndarray:
+    """Ids of the scope's stored chunks, excluding files still being ingested."""
+    owner = File.group_id == scope_id if scope == "group" else (File.course_id == scope_id) & File.group_id.is_(None)
+    active = db.query(IngestionJob.file_id).filter(IngestionJob.status.in_(("queued", "running")), IngestionJob.file_id.isnot(None))
+    rows = (
+        db.query(DocumentChunk.id)
+        .join(File, DocumentChunk.file_id == File.id)
+        .filter(owner, File.id.notin_(active))
+        .all()
+    )
+    return np.array(sorted(r.id for r in rows), dtype=np.int64)
+
+
+def _chunk_texts(db, chunk_ids: list[int]) -> dict[int, str]:
+    texts = {}
+    for start in range(0, len(chunk_ids), _FETCH_BATCH):
+        rows = (
+            db.query(DocumentChunk.id, DocumentChunk.chunk_text)
+            .filter(DocumentChunk.id.in_(chunk_ids[start : start + _FETCH_BATCH]))
+            .all()
+        )
+        texts.update((r.id, r.chunk_text) for r in rows)
+    return texts
+
+
+def _stray_files(scope: str, scope_id: int) -> list[Path]:
+    """Temp files of interrupted writes and pre-ID-map sidecars (.meta.txt / .ids)."""
+    prefix = f"{scope}_{scope_id}."
+    stray = [p for p in VECTOR_INDEX_DIR.glob(f"{prefix}*") if p.name.endswith(".tmp")]
+    stray += [p for p in (VECTOR_INDEX_DIR / f"{prefix}meta.txt", VECTOR_INDEX_DIR / f"{prefix}ids") if p.exists()]
+    lex_dir = VECTOR_INDEX_DIR / f"{prefix}lex"
+    if lex_dir.is_dir():
+        stray += [p for p in lex_dir.iterdir() if ".tmp" in p.name]
+    return stray
+
+
+def check(db, scope: str, scope_id: int) -> list[str]:
+    """Problems found for one scope (empty if consistent)."""
+    problems = []
+    expected = _db_chunk_ids(db, scope, scope_id)
+    indexed = vector_store.get_index_chunk_ids(scope, scope_id)
+    if indexed is None:
+        if len(expected):
+            problems.append(f"no index, {len(expected)} chunks in DB")
+    else:
+        missing = np.setdiff1d(expected, indexed)
+        orphaned = np.setdiff1d(indexed, expected)
+        duplicates = len(indexed) - len(np.unique(indexed))
+        if len(missing):
+            problems.append(f"{len(missing)} chunks not indexed")
+        if len(orphaned):
+            problems.append(f"{len(orphaned)} vectors of deleted chunks")
+        if duplicates:
+            problems.append(f"{duplicates} duplicate ids")
+        exact_ids = vector_store.get_exact_store_ids(scope, scope_id)
+        if exact_ids is not None:
+            without_exact = np.setdiff1d(indexed, exact_ids)
+            dead_rows = len(exact_ids) - np.isin(exact_ids, np.unique(indexed)).sum()
+            if len(without_exact):
+                problems.append(f"{len(without_exact)} vectors missing from the exact store")
+            if dead_rows:
+                problems.append(f"{dead_rows} dead rows in the exact store")
+    lexical = lexical_index.get_indexed_ids(scope, scope_id)
+    if lexical is not None:
+        if len(np.setdiff1d(expected, lexical)) or len(np.setdiff1d(lexical, expected)):
+            problems.append(
+                f"lexical index: {len(np.setdiff1d(expected, lexical))} missing, "
+                f"{len(np.setdiff1d(lexical, expected))} deleted"
+            )
+    elif len(expected):
+        problems.append("no lexical index")
+    stray = _stray_files(scope, scope_id)
+    if stray:
+        problems.append(f"stray files: {', '.join(p.name for p in stray)}")
+    return problems
+
+
+def compact(db, scope: str, scope_id: int) -> str:
+    expected = _db_chunk_ids(db, scope, scope_id)
+    # Temp files are removed by compact_index under the scope lock; legacy sidecars are folded
+    # into the index on its next read
+    stats = vector_store.compact_index(scope, scope_id, expected)
+    lexical = lexical_index.get_indexed_ids(scope, scope_id)
+    lexical_removed = 0
+    if lexical is not None:
+        deleted = np.setdiff1d(lexical, expected)
+        lexical_removed = len(deleted)
+        lexical_index.remove_documents(scope, scope_id, deleted.tolist())
+        lexical_index.compact_index(scope, scope_id)
+    if stats is None:
+        return f"no index; lexical -{lexical_removed}"
+    return (
+        f"-{stats['removed']} vectors, -{stats['exact_rows_dropped']} exact rows, "
+        f"lexical -{lexical_removed}; {stats['ntotal']} vectors"
+    )
+
+
+def _embed(texts: list[str], workers: int, batch: int) -> np.ndarray:
+    """Encode in parallel batches; encode() answers cache hits without touching the model, and
+    misses run on the inference executor sized to workers in main().
+    """
+    batches = [texts[i : i + batch] for i in range(0, len(texts), batch)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(encode, batches))
+    return np.array([vec for part in parts for vec in part], dtype=np.float32)
+
+
+def rebuild(db, scope: str, scope_id: int, reembed: bool, workers: int, batch: int) -> str:
+    known = vector_store.get_index_chunk_ids(scope, scope_id)
+    expected = _db_chunk_ids(db, scope, scope_id)
+    texts = _chunk_texts(db, expected.tolist())
+    chunk_ids = [cid for cid in expected.tolist() if cid in texts]
+
+    stored, found = (None, np.zeros(len(chunk_ids), dtype=bool))
+    if known is not None and not reembed and chunk_ids:
+        stored, found = vector_store.get_vectors(scope, scope_id, chunk_ids)
+    to_embed = [texts[cid] for cid, ok in zip(chunk_ids, found) if not ok]
+    t0 = time.perf_counter()
+    embedded = _embed(to_embed, workers, batch) if to_embed else np.empty((0, 0), dtype=np.float32)
+    embed_seconds = time.perf_counter() - t0
+    if chunk_ids:
+        dimension = embedded.shape[1] if len(embedded) else stored.shape[1]
+        vectors = np.zeros((len(chunk_ids), dimension), dtype=np.float32)
+        if found.any():
+            vectors[found] = stored[found]
+        vectors[~found] = embedded.reshape(-1, dimension)
+    else:
+        vectors = np.empty((0, 0), dtype=np.float32)
+
+    stats = vector_store.rebuild_index(
+        scope, scope_id, vectors, chunk_ids, known_ids=known if known is not None else np.empty(0, dtype=np.int64)
+    )
+    # Include chunks of uploads that finished during the rebuild (carried over into the new index)
+    carried = np.setdiff1d(vector_store.get_index_chunk_ids(scope, scope_id), chunk_ids).tolist()
+    if carried:
+        texts.update(_chunk_texts(db, carried))
+    lexical_ids = chunk_ids + [cid for cid in carried if cid in texts]
+    lexical_index.rebuild_index(scope, scope_id, lexical_ids, [texts[cid] for cid in lexical_ids])
+    return (
+        f"{stats['ntotal']} vectors ({stats['tier']}/{stats['compression']}), "
+        f"{int(found.sum())} reused, {len(to_embed)} embedded in {embed_seconds:.1f} s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["check", "compact", "rebuild"])
+    parser.add_argument("--scope", choices=["course", "group"])
+    parser.add_argument("--scope-id", type=int)
+    parser.add_argument("--reembed", action="store_true", help="rebuild: re-encode every chunk instead of reusing stored vectors")
+    parser.add_argument("--workers", type=int, default=4, help="rebuild: parallel embedding batches (model inference threads)")
+    parser.add_argument("--batch", type=int, default=INGESTION_EMBED_BATCH, help="rebuild: texts per embedding batch")
+    args = parser.parse_args()
+    if args.command == "rebuild":
+        set_inference_threads(args.workers)
+
+    db = SessionLocal()
+    drifted = 0
+    try:
+        for scope, scope_id in _scopes(db, args.scope, args.scope_id):
+            if args.command == "check":
+                problems = check(db, scope, scope_id)
+                drifted += bool(problems)
+                print(f"{scope} {scope_id}: {'; '.join(problems) if problems else 'ok'}")
+            elif args.command == "compact":
+                print(f"{scope} {scope_id}: {compact(db, scope, scope_id)}")
+            else:
+                print(f"{scope} {scope_id}: {rebuild(db, scope, scope_id, args.reembed, args.workers, args.batch)}")
+        if args.command == "compact":
+            print(f"embedding cache: -{prune_embedding_cache()} rows")
+    finally:
+        db.close()
+        vector_store.shutdown_search_executor()
+    if drifted:
+        sys.exit(f"{drifted} scope(s) out of sync; run compact (deleted chunks) or rebuild")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+One-time migration of vector indexes to ID-mapped FAISS indexes.
+Folds the old .meta.txt / .ids chunk-id sidecars into the .index files and deletes them.
+Run from backend directory: python scripts/migrate_vector_meta.py
+Safe to re-run; already migrated scopes are skipped. The app also migrates lazily on first use.
+"""
+import sys
+from pathlib import Path
+
+# Ensure backend app is on path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.ai.vector_store import migrate_legacy_indexes
+from app.config import VECTOR_INDEX_DIR
+
+
+def main():
+    migrated = migrate_legacy_indexes()
+    print(f"Migrated {migrated} index(es) in {VECTOR_INDEX_DIR}")
+
+
+if __name__ == "__main__":
+    main()
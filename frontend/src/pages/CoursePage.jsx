@@ -132,7 +132,7 @@ export default function CoursePage() {
     setUploadLoading(true);
     try {
       await uploadCourseFile(courseId, file, token);
-      setUploadSuccess(`"${file.name}" uploaded and indexed.`);
+      setUploadSuccess(`"${file.name}" uploaded. Indexing in the background...`);
     } catch (err) {
       setUploadError(err.message);
     } finally {